@@ -3,17 +3,29 @@ FC온라인 선수 카드 웹 애플리케이션
 Flask + PostgreSQL
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, g, has_request_context
+from flask import Response, stream_with_context
 from functools import wraps
+import click
 from authlib.integrations.flask_client import OAuth
 import os
 from datetime import datetime, timedelta
 from dotenv import load_dotenv  # ← 추가!
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.pool
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, execute_values
 import json
+import re
 import pytz
 import hashlib
+import base64
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, replace
+import heapq
+import atexit
+import threading
+import time
 
 # .env 파일 로드  # ← 추가!
 load_dotenv()       # ← 추가!
@@ -156,7 +168,7 @@ def sitemap():
     return Response('\n'.join(xml), mimetype='application/xml')
 
 
-# 시즌 정렬 순서 (공식 홈페이지 기준)
+# 시즌 정렬 순서 (공식 홈페이지 기준) — season_order 테이블의 원본, 바꾸면 sync-season-order 실행
 SEASON_ORDER = [
     100, 110, 101, 113, 114, 111, 867, 596, 864, 863, 862, 861, 852, 851, 848, 868, 850, 846, 845, 849, 840,
     839, 836, 829, 828, 827, 826, 825, 821, 815, 818,
@@ -182,176 +194,1897 @@ STAT_NAMES = [
     "GK 다이빙", "GK 핸들링", "GK 킥", "GK 반응속도", "GK 위치 선정"
 ]
 
+# DB 커넥션 풀 설정 (gunicorn 워커 프로세스별)
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))              # 체크아웃 대기 최대 시간(초)
+DB_POOL_PING_INTERVAL = float(os.getenv('DB_POOL_PING_INTERVAL', 30))  # 이 시간 이상 쉰 연결은 체크아웃 시 핑
+
+
+class DBPool:
+    """프로세스 단위 커넥션 풀 (헬스체크 + 메트릭)"""
+
+    def __init__(self, minconn, maxconn, timeout, ping_interval):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._cond = threading.Condition()
+        self._idle = []        # [(conn, 반납 시각)]
+        self._in_use = 0
+        self._pid = None
+        # 메트릭
+        self.checkouts = 0
+        self.exhausted_count = 0   # 빈 연결이 없어 대기해야 했던 횟수
+        self.timeout_count = 0     # 대기하다 타임아웃 난 횟수
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.connects = 0
+        self.discards = 0
+
+    def _connect(self):
+        self.connects += 1
+        return psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
+
+    def _check_fork(self):
+        """fork 이후 부모 프로세스의 소켓을 공유하지 않도록 풀 초기화"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle = []
+            self._in_use = 0
+            for _ in range(self.minconn):
+                try:
+                    self._idle.append((self._connect(), time.monotonic()))
+                except psycopg2.Error:
+                    break
+
+    def _is_healthy(self, conn, idle_since):
+        """체크아웃 시 헬스체크 (오래 쉰 연결만 SELECT 1)"""
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.ping_interval:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self.discards += 1
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        start = time.monotonic()
+        with self._cond:
+            self._check_fork()
+            if not self._idle and self._in_use >= self.maxconn:
+                self.exhausted_count += 1
+                deadline = start + self.timeout
+                while not self._idle and self._in_use >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeout_count += 1
+                        raise psycopg2.pool.PoolError('DB 커넥션 풀 고갈 (대기 시간 초과)')
+                    self._cond.wait(remaining)
+            entry = self._idle.pop() if self._idle else None
+            self._in_use += 1
+            waited = time.monotonic() - start
+            self.checkouts += 1
+            self.wait_time_total += waited
+            self.wait_time_max = max(self.wait_time_max, waited)
+
+        try:
+            if entry and self._is_healthy(*entry):
+                return entry[0]
+            if entry:
+                self._discard(entry[0])
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def putconn(self, conn):
+        """반납 시 열린 트랜잭션 정리 후 풀에 되돌림"""
+        keep = not conn.closed
+        if keep:
+            try:
+                status = conn.get_transaction_status()
+                if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                    keep = False
+                elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                keep = False
+
+        with self._cond:
+            if conn.closed or not keep:
+                self._discard(conn)
+            elif self._pid == os.getpid() and len(self._idle) < self.maxconn:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._discard(conn)
+            if self._pid == os.getpid():
+                self._in_use = max(self._in_use - 1, 0)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pid': os.getpid(),
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'checkouts': self.checkouts,
+                'exhausted_count': self.exhausted_count,
+                'timeout_count': self.timeout_count,
+                'wait_time_avg_ms': round(self.wait_time_total / self.checkouts * 1000, 3) if self.checkouts else 0,
+                'wait_time_max_ms': round(self.wait_time_max * 1000, 3),
+                'connects': self.connects,
+                'discards': self.discards,
+            }
+
+
+db_pool = DBPool(DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_PING_INTERVAL)
+
+
+class PooledConnection:
+    """풀 연결 래퍼: close()는 실제로 닫지 않고 요청 종료 시 풀에 반납"""
+
+    def __init__(self, conn, request_scoped):
+        self._conn = conn
+        self._request_scoped = request_scoped
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        # 요청 스코프 연결은 teardown 에서 반납 (같은 요청 내 재사용)
+        if not self._request_scoped and self._conn is not None:
+            db_pool.putconn(self._conn)
+            self._conn = None
+
+
 def get_db_connection():
-    """DB 연결 생성"""
-    conn = psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
-    return conn
-
-def build_search_conditions(player_names, selected_seasons, selected_positions, min_ovr, max_ovr,
-                            min_salary, max_salary, preferred_foot, weak_foot_min, min_height, max_height,
-                            min_weight, max_weight, selected_body_types, selected_traits, nation_team_color,
-                            club_team_color_1, club_team_color_2, trait_team_color, has_new_trait=False):
-    """검색 조건 SQL 문자열과 파라미터 생성 (재사용 가능)"""
-    conditions = ""
-    params = []
-    
-    # 선수 이름
-    if player_names:
-        name_conditions = []
-        for name in player_names:
-            name_conditions.append("player_name ILIKE %s")
-            params.append(f'%{name}%')
-        conditions += f" AND ({' OR '.join(name_conditions)})"
-    
-    # 시즌 필터링 (선택된 경우만)
-    if selected_seasons:
-        season_conditions = []
-        for season_id in selected_seasons:
-            season_conditions.append("LEFT(spid::text, 3) = %s")
-            params.append(str(season_id))
-        conditions += f" AND ({' OR '.join(season_conditions)})"
-    # 시즌 미선택 시 조건 추가 안 함 (전체 검색)    
-    
-    # 포지션 필터링
-    if selected_positions:
-        position_conditions = []
-        for pos in selected_positions:
-            position_conditions.append("""
-                EXISTS (
-                    SELECT 1 
-                    FROM jsonb_array_elements(
-                        player_cards.full_data->'stats_info'->'main_overall'->'preferred_positions'             
-                    ) AS pp
-                    WHERE pp->>'position' = %s
-                )
-            """)
-            params.append(pos)
-        conditions += f" AND ({' OR '.join(position_conditions)})"
-    
-    # 오버롤
-    if min_ovr:
-        conditions += " AND overall >= %s"
-        params.append(int(min_ovr))
-    if max_ovr:
-        conditions += " AND overall <= %s"
-        params.append(int(max_ovr))
-    
-    # 급여
-    if min_salary:
-        conditions += " AND CAST(player_cards.full_data->'game_info'->>'salary' AS INTEGER) >= %s"
-        params.append(int(min_salary))
-    if max_salary:
-        conditions += " AND CAST(player_cards.full_data->'game_info'->>'salary' AS INTEGER) <= %s"
-        params.append(int(max_salary))
-    
-    # 주발
-    if preferred_foot:
-        if preferred_foot == 'left':
-            conditions += " AND player_cards.full_data->'game_info'->>'preferred_foot' ILIKE %s"
-            params.append('%L%')
-        elif preferred_foot == 'right':
-            conditions += " AND player_cards.full_data->'game_info'->>'preferred_foot' ILIKE %s"
-            params.append('%R%')
-    
-    # 약발
-    if weak_foot_min:
-        conditions += """ AND (
-            SELECT CAST(regexp_replace(
-                player_cards.full_data->'game_info'->>'weak_foot', 
-                '[^0-9]', '', 'g'
-            ) AS INTEGER)
-        ) >= %s"""
-        params.append(int(weak_foot_min))
-    
-    # 키
-    if min_height:
-        conditions += """ AND CAST(regexp_replace(
-            player_cards.full_data->'basic_info'->>'height', 
-            '[^0-9]', '', 'g'
-        ) AS INTEGER) >= %s"""
-        params.append(int(min_height))
-    if max_height:
-        conditions += """ AND CAST(regexp_replace(
-            player_cards.full_data->'basic_info'->>'height', 
-            '[^0-9]', '', 'g'
-        ) AS INTEGER) <= %s"""
-        params.append(int(max_height))
-    
-    # 몸무게
-    if min_weight:
-        conditions += """ AND CAST(regexp_replace(
-            player_cards.full_data->'basic_info'->>'weight', 
-            '[^0-9]', '', 'g'
-        ) AS INTEGER) >= %s"""
-        params.append(int(min_weight))
-    if max_weight:
-        conditions += """ AND CAST(regexp_replace(
-            player_cards.full_data->'basic_info'->>'weight', 
-            '[^0-9]', '', 'g'
-        ) AS INTEGER) <= %s"""
-        params.append(int(max_weight))
-    
-    # 체형
-    if selected_body_types:
-        body_type_conditions = []
-        for body_type in selected_body_types:
-            body_type_conditions.append("player_cards.full_data->'basic_info'->>'body_type' = %s")
-            params.append(body_type)
-        conditions += f" AND ({' OR '.join(body_type_conditions)})"
-    
-    # 특성
-    if selected_traits:
-        for trait in selected_traits:
+    """DB 연결 체크아웃 (요청당 1개, 요청 종료 시 자동 반납)"""
+    if not has_request_context():
+        return PooledConnection(db_pool.getconn(), request_scoped=False)
+    if '_db_conn' not in g:
+        g._db_conn = PooledConnection(db_pool.getconn(), request_scoped=True)
+    return g._db_conn
+
+
+@app.teardown_appcontext
+def release_db_connection(exc):
+    """요청 종료 시 연결 반납"""
+    pooled = g.pop('_db_conn', None)
+    if pooled is not None:
+        db_pool.putconn(pooled._conn)
+
+
+@app.route('/api/db_pool_stats')
+@admin_required
+def db_pool_stats():
+    """관리자 전용: 현재 워커의 커넥션 풀 메트릭"""
+    return jsonify(db_pool.stats())
+
+
+# 스키마 DDL (flask --app app init-db 로 순서대로 실행, 모두 재실행 가능)
+SCHEMA_DDL = []
+
+
+def _jsonb_int(expr):
+    """'180cm', '★3' 같은 JSONB 텍스트에서 숫자만 뽑아 INTEGER 로 변환하는 SQL 식"""
+    return f"CAST(NULLIF(regexp_replace({expr}, '[^0-9]', '', 'g'), '') AS INTEGER)"
+
+
+# player_cards.full_data 에서 검색용 속성을 뽑는 SELECT 목록 (pc = player_cards 행)
+CARD_ATTRIBUTES_COLUMNS = f"""
+    pc.spid,
+    CAST(LEFT(pc.spid::text, 3) AS INTEGER) AS season_id,
+    (SELECT so.season_rank FROM season_order so
+     WHERE so.season_id = CAST(LEFT(pc.spid::text, 3) AS INTEGER)) AS season_rank,
+    RIGHT(pc.spid::text, 6) AS pid,
+    {_jsonb_int("pc.full_data->'game_info'->>'salary'")} AS salary,
+    {_jsonb_int("pc.full_data->'basic_info'->>'height'")} AS height,
+    {_jsonb_int("pc.full_data->'basic_info'->>'weight'")} AS weight,
+    {_jsonb_int("pc.full_data->'game_info'->>'weak_foot'")} AS weak_foot,
+    CASE
+        WHEN pc.full_data->'game_info'->>'preferred_foot' ILIKE '%L%' THEN 'L'
+        WHEN pc.full_data->'game_info'->>'preferred_foot' ILIKE '%R%' THEN 'R'
+    END AS preferred_foot,
+    pc.full_data->'basic_info'->>'body_type' AS body_type,
+    pc.full_data->'basic_info'->>'nation' AS nation,
+    {_jsonb_int("pc.full_data->'game_info'->>'skill_moves'")} AS skill_moves
+"""
+
+CARD_ATTRIBUTES_UPSERT = """
+    INSERT INTO card_attributes
+        (spid, season_id, season_rank, pid, salary, height, weight, weak_foot,
+         preferred_foot, body_type, nation, skill_moves)
+    SELECT {columns}
+    FROM {source}
+    ON CONFLICT (spid) DO UPDATE SET
+        season_id = EXCLUDED.season_id,
+        season_rank = EXCLUDED.season_rank,
+        pid = EXCLUDED.pid,
+        salary = EXCLUDED.salary,
+        height = EXCLUDED.height,
+        weight = EXCLUDED.weight,
+        weak_foot = EXCLUDED.weak_foot,
+        preferred_foot = EXCLUDED.preferred_foot,
+        body_type = EXCLUDED.body_type,
+        nation = EXCLUDED.nation,
+        skill_moves = EXCLUDED.skill_moves
+"""
+
+SCHEMA_DDL.append("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+# 시즌 정렬 순서 테이블 (SEASON_ORDER 는 초기값, sync-season-order 로 반영)
+SCHEMA_DDL.append("""
+    CREATE TABLE IF NOT EXISTS season_order (
+        season_id INTEGER PRIMARY KEY,
+        season_rank INTEGER NOT NULL
+    );
+""")
+SCHEMA_DDL.append("""
+    CREATE TABLE IF NOT EXISTS card_attributes (
+        spid BIGINT PRIMARY KEY REFERENCES player_cards(spid) ON DELETE CASCADE,
+        season_id INTEGER NOT NULL,
+        pid TEXT NOT NULL,
+        salary INTEGER,
+        height INTEGER,
+        weight INTEGER,
+        weak_foot INTEGER,
+        preferred_foot CHAR(1),
+        body_type TEXT,
+        nation TEXT,
+        skill_moves INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS card_attributes_season_idx ON card_attributes (season_id);
+    CREATE INDEX IF NOT EXISTS card_attributes_pid_idx ON card_attributes (pid);
+    CREATE INDEX IF NOT EXISTS card_attributes_salary_idx ON card_attributes (salary);
+    CREATE INDEX IF NOT EXISTS card_attributes_height_idx ON card_attributes (height);
+    CREATE INDEX IF NOT EXISTS card_attributes_weight_idx ON card_attributes (weight);
+    CREATE INDEX IF NOT EXISTS card_attributes_weak_foot_idx ON card_attributes (weak_foot);
+    CREATE INDEX IF NOT EXISTS card_attributes_foot_idx ON card_attributes (preferred_foot);
+    CREATE INDEX IF NOT EXISTS card_attributes_body_type_idx ON card_attributes (body_type);
+    CREATE INDEX IF NOT EXISTS card_attributes_skill_moves_idx ON card_attributes (skill_moves);
+    CREATE INDEX IF NOT EXISTS card_attributes_nation_trgm_idx
+        ON card_attributes USING gin (nation gin_trgm_ops);
+
+    ALTER TABLE card_attributes ADD COLUMN IF NOT EXISTS season_rank INTEGER;
+    CREATE INDEX IF NOT EXISTS card_attributes_season_rank_idx ON card_attributes (season_rank, season_id);
+""")
+# 포지션별 오버롤 (stats_info.position_overall 을 행으로 펼침, 포지션 오버롤 정렬용)
+SCHEMA_DDL.append("""
+    CREATE TABLE IF NOT EXISTS card_position_overall (
+        spid BIGINT NOT NULL REFERENCES player_cards(spid) ON DELETE CASCADE,
+        position TEXT NOT NULL,
+        overall INTEGER,
+        PRIMARY KEY (spid, position)
+    );
+    CREATE INDEX IF NOT EXISTS card_position_overall_sort_idx
+        ON card_position_overall (position, overall DESC NULLS LAST, spid);
+""")
+
+CARD_POSITION_OVERALL_SYNC = f"""
+    DELETE FROM card_position_overall WHERE spid IN (SELECT pc.spid FROM {{source}});
+    INSERT INTO card_position_overall (spid, position, overall)
+    SELECT pc.spid, po.key, {_jsonb_int("po.value")}
+    FROM {{source}}, jsonb_each_text(pc.full_data->'stats_info'->'position_overall') AS po
+"""
+
+# 크롤러가 player_cards 를 쓰면 트리거로 card_attributes / card_position_overall 동기화
+_NEW_ROW = "(SELECT NEW.spid AS spid, NEW.full_data AS full_data) pc"
+SCHEMA_DDL.append(f"""
+    CREATE OR REPLACE FUNCTION card_attributes_sync() RETURNS trigger AS $$
+    BEGIN
+        {CARD_ATTRIBUTES_UPSERT.format(columns=CARD_ATTRIBUTES_COLUMNS, source=_NEW_ROW)};
+        {CARD_POSITION_OVERALL_SYNC.format(source=_NEW_ROW)};
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS player_cards_attributes_sync ON player_cards;
+    CREATE TRIGGER player_cards_attributes_sync
+        AFTER INSERT OR UPDATE OF full_data ON player_cards
+        FOR EACH ROW EXECUTE FUNCTION card_attributes_sync();
+""")
+# season_order 가 바뀌면 card_attributes.season_rank 재계산
+SCHEMA_DDL.append("""
+    CREATE OR REPLACE FUNCTION season_rank_sync() RETURNS trigger AS $$
+    BEGIN
+        UPDATE card_attributes ca
+        SET season_rank = so.season_rank
+        FROM (SELECT ca2.spid, so2.season_rank
+              FROM card_attributes ca2
+              LEFT JOIN season_order so2 ON so2.season_id = ca2.season_id) so
+        WHERE ca.spid = so.spid
+          AND ca.season_rank IS DISTINCT FROM so.season_rank;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS season_order_rank_sync ON season_order;
+    CREATE TRIGGER season_order_rank_sync
+        AFTER INSERT OR UPDATE OR DELETE ON season_order
+        FOR EACH STATEMENT EXECUTE FUNCTION season_rank_sync();
+""")
+
+# 강화 단계별 최신 시세 (시세 추이 수집 시 트리거로 갱신, 조회 시 full_data 를 풀지 않음)
+# 시세 추이에 값이 하나라도 있으면 추이의 마지막 값, 없으면 card_prices 행을 그대로 사용
+SCHEMA_DDL.append("""
+    CREATE TABLE IF NOT EXISTS card_latest_prices (
+        spid BIGINT PRIMARY KEY,
+""" + "".join(f"        bp{n} BIGINT,\n" for n in range(1, 14)) + """
+        source TEXT NOT NULL,
+        as_of TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+""")
+
+
+def _jsonb_price(expr):
+    """시세 JSONB 값(숫자 또는 '123' 문자열) → BIGINT 로 변환하는 SQL 식"""
+    return f"CAST(CAST(NULLIF(regexp_replace({expr}, '[^0-9.]', '', 'g'), '') AS NUMERIC) AS BIGINT)"
+
+
+_HISTORY_LATEST = ",\n".join(
+    _jsonb_price(f"(CASE jsonb_typeof(ph.full_data->'{n}')"
+                 f" WHEN 'object' THEN ph.full_data->'{n}'->'values'->-1"
+                 f" WHEN 'array' THEN ph.full_data->'{n}'->-1 END) #>> '{{{{}}}}'") + f" AS bp{n}"
+    for n in range(1, 14)
+)
+_LATEST_PRICE_COLUMNS = ", ".join(f"bp{n}" for n in range(1, 14))
+# {source}: 갱신할 spid 목록 (s.spid)
+LATEST_PRICES_SYNC = f"""
+    DELETE FROM card_latest_prices WHERE spid IN (SELECT s.spid FROM {{source}});
+    INSERT INTO card_latest_prices (spid, {_LATEST_PRICE_COLUMNS}, source, as_of)
+    SELECT s.spid,
+           {", ".join(f"COALESCE(h.bp{n}, CAST(cp.bp{n} AS BIGINT))" for n in range(1, 14))},
+           CASE WHEN h.has_values THEN 'history' ELSE 'card_prices' END,
+           now()
+    FROM {{source}}
+    LEFT JOIN LATERAL (
+        SELECT *, COALESCE({_LATEST_PRICE_COLUMNS}) IS NOT NULL AS has_values
+        FROM (SELECT {_HISTORY_LATEST}
+              FROM card_price_history ph WHERE ph.spid = s.spid) latest
+    ) h ON true
+    LEFT JOIN card_prices cp ON cp.spid = s.spid
+    WHERE h.has_values OR cp.spid IS NOT NULL
+"""
+SCHEMA_DDL.append(f"""
+    CREATE OR REPLACE FUNCTION card_latest_prices_sync() RETURNS trigger AS $$
+    DECLARE
+        changed_spid BIGINT;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            changed_spid := OLD.spid;
+        ELSE
+            changed_spid := NEW.spid;
+        END IF;
+        {LATEST_PRICES_SYNC.format(source="(SELECT changed_spid AS spid) s")};
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS card_price_history_latest_sync ON card_price_history;
+    CREATE TRIGGER card_price_history_latest_sync
+        AFTER INSERT OR UPDATE OR DELETE ON card_price_history
+        FOR EACH ROW EXECUTE FUNCTION card_latest_prices_sync();
+    DROP TRIGGER IF EXISTS card_prices_latest_sync ON card_prices;
+    CREATE TRIGGER card_prices_latest_sync
+        AFTER INSERT OR UPDATE OR DELETE ON card_prices
+        FOR EACH ROW EXECUTE FUNCTION card_latest_prices_sync();
+""")
+
+
+def sync_latest_prices(cur):
+    """card_price_history / card_prices 전체로 card_latest_prices 재적재 (최초 백필/복구용)"""
+    cur.execute("TRUNCATE card_latest_prices")
+    cur.execute(LATEST_PRICES_SYNC.format(
+        source="(SELECT spid FROM card_price_history UNION SELECT spid FROM card_prices) s"))
+    return cur.rowcount
+
+
+# 강화 단계별 시세 추이를 정렬된 (시각, 가격) 배열로 보관 — 구간 조회 시 JSON 전체를 풀지 않음
+SCHEMA_DDL.append("""
+    CREATE TABLE IF NOT EXISTS card_price_series (
+        spid BIGINT NOT NULL,
+        boost SMALLINT NOT NULL,
+        times TIMESTAMP[] NOT NULL,
+        prices BIGINT[] NOT NULL,
+        PRIMARY KEY (spid, boost)
+    );
+
+    -- 시세 추이 times 값 → TIMESTAMP (epoch 초/밀리초 숫자 또는 날짜 문자열, 해석 불가면 NULL)
+    CREATE OR REPLACE FUNCTION price_history_time(value TEXT) RETURNS TIMESTAMP AS $$
+    BEGIN
+        IF value ~ '^[0-9]+(\\.[0-9]+)?$' THEN
+            RETURN to_timestamp(CASE WHEN value::numeric > 100000000000 THEN value::numeric / 1000
+                                     ELSE value::numeric END) AT TIME ZONE 'UTC';
+        END IF;
+        RETURN value::timestamp;
+    EXCEPTION WHEN others THEN
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql STABLE;
+""")
+
+
+def _jsonb_array(expr):
+    """배열이 아니면 빈 배열로 바꾸는 SQL 식 (jsonb_array_elements 오류 방지)"""
+    return f"CASE jsonb_typeof({expr}) WHEN 'array' THEN {expr} ELSE '[]'::jsonb END"
+
+
+# {source}: 갱신할 spid 목록 (s.spid)
+PRICE_SERIES_SYNC = f"""
+    DELETE FROM card_price_series WHERE spid IN (SELECT s.spid FROM {{source}});
+    INSERT INTO card_price_series (spid, boost, times, prices)
+    SELECT ph.spid, CAST(b.key AS SMALLINT),
+           array_agg(p.at ORDER BY p.at), array_agg(p.price ORDER BY p.at)
+    FROM {{source}}
+    JOIN card_price_history ph ON ph.spid = s.spid
+    CROSS JOIN LATERAL jsonb_each(ph.full_data) b
+    CROSS JOIN LATERAL (
+        SELECT price_history_time(t.value #>> '{{{{}}}}') AS at,
+               {_jsonb_price("v.value #>> '{{}}'")} AS price
+        FROM jsonb_array_elements({_jsonb_array("b.value->'times'")}) WITH ORDINALITY t(value, i)
+        JOIN jsonb_array_elements({_jsonb_array("b.value->'values'")}) WITH ORDINALITY v(value, i) USING (i)
+    ) p
+    WHERE b.key ~ '^[0-9]+$' AND p.at IS NOT NULL AND p.price IS NOT NULL
+    GROUP BY ph.spid, b.key
+"""
+SCHEMA_DDL.append(f"""
+    CREATE OR REPLACE FUNCTION card_price_series_sync() RETURNS trigger AS $$
+    DECLARE
+        changed_spid BIGINT;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            changed_spid := OLD.spid;
+        ELSE
+            changed_spid := NEW.spid;
+        END IF;
+        {PRICE_SERIES_SYNC.format(source="(SELECT changed_spid AS spid) s")};
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS card_price_history_series_sync ON card_price_history;
+    CREATE TRIGGER card_price_history_series_sync
+        AFTER INSERT OR UPDATE OR DELETE ON card_price_history
+        FOR EACH ROW EXECUTE FUNCTION card_price_series_sync();
+""")
+
+
+def sync_price_series(cur):
+    """card_price_history 전체를 card_price_series 로 재적재 (최초 백필/복구용)"""
+    cur.execute("TRUNCATE card_price_series")
+    cur.execute(PRICE_SERIES_SYNC.format(source="(SELECT spid FROM card_price_history) s"))
+    return cur.rowcount
+
+
+def sync_card_attributes(cur):
+    """player_cards 전체를 card_attributes / card_position_overall 로 재적재 (최초 백필/복구용)"""
+    cur.execute(CARD_ATTRIBUTES_UPSERT.format(columns=CARD_ATTRIBUTES_COLUMNS, source="player_cards pc"))
+    count = cur.rowcount
+    cur.execute(CARD_POSITION_OVERALL_SYNC.format(source="player_cards pc"))
+    return count
+
+
+def sync_season_order(cur, season_order=None):
+    """season_order 테이블을 SEASON_ORDER(또는 주어진 순서)로 맞춤 — 바뀐 행만 갱신"""
+    season_order = SEASON_ORDER if season_order is None else season_order
+    cur.execute("DELETE FROM season_order WHERE season_id <> ALL(%s)", (season_order,))
+    cur.execute("""
+        INSERT INTO season_order (season_id, season_rank)
+        SELECT season_id, season_rank
+        FROM unnest(%s::integer[]) WITH ORDINALITY AS t(season_id, season_rank)
+        ON CONFLICT (season_id) DO UPDATE SET season_rank = EXCLUDED.season_rank
+        WHERE season_order.season_rank IS DISTINCT FROM EXCLUDED.season_rank
+    """, (season_order,))
+
+
+@app.cli.command('init-db')
+def init_db_command():
+    """검색/캐시용 파생 테이블, 인덱스, 트리거 생성"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            for ddl in SCHEMA_DDL:
+                cur.execute(ddl)
+            # 최초 적용 시에만 SEASON_ORDER 로 채움 (이후에는 sync-season-order)
+            cur.execute("SELECT EXISTS (SELECT 1 FROM season_order) AS seeded")
+            if not cur.fetchone()['seeded']:
+                sync_season_order(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"스키마 적용 완료 ({len(SCHEMA_DDL)}개)")
+
+
+@app.cli.command('sync-card-attributes')
+def sync_card_attributes_command():
+    """card_attributes 백필"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            count = sync_card_attributes(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"card_attributes {count}건 동기화")
+
+
+@app.cli.command('sync-season-order')
+def sync_season_order_command():
+    """코드의 SEASON_ORDER 를 season_order 테이블에 반영"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            sync_season_order(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"season_order {len(SEASON_ORDER)}개 시즌 반영")
+
+
+@app.cli.command('sync-latest-prices')
+def sync_latest_prices_command():
+    """card_latest_prices 백필"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            count = sync_latest_prices(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"card_latest_prices {count}건 동기화")
+
+
+@app.cli.command('sync-price-series')
+def sync_price_series_command():
+    """card_price_series 백필"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            count = sync_price_series(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"card_price_series {count}건 동기화")
+
+
+# 검색 쿼리 FROM 절 (필터는 card_attributes 의 타입 컬럼 사용)
+SEARCH_FROM = "player_cards JOIN card_attributes ca ON ca.spid = player_cards.spid"
+
+# 검색 정렬 키 (overall DESC, player_name, spid) — keyset 페이지네이션용
+SCHEMA_DDL.append("""
+    CREATE INDEX IF NOT EXISTS player_cards_search_order_idx
+        ON player_cards (overall DESC, player_name, spid);
+""")
+# 그 외 정렬 모드 (정렬 키, spid) 인덱스 — SearchSort
+SCHEMA_DDL.append("""
+    CREATE INDEX IF NOT EXISTS card_attributes_salary_sort_idx ON card_attributes (salary, spid);
+    CREATE INDEX IF NOT EXISTS card_attributes_season_rank_sort_idx ON card_attributes (season_rank, spid);
+""" + "".join(
+    f"    CREATE INDEX IF NOT EXISTS card_prices_bp{n}_sort_idx ON card_prices (bp{n}, spid);\n"
+    for n in range(1, 14)
+))
+
+
+def like_contains(text):
+    """부분 일치 LIKE 패턴 — 입력의 %, _, \\ 는 와일드카드가 아닌 글자 그대로 (인메모리 엔진과 동일)"""
+    return '%' + text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+# 비트맵 인덱스가 처리하는 멤버십 필터 (해석 후 비워서 SQL 로 넘김)
+MEMBERSHIP_FIELDS = ('positions', 'traits', 'has_new_trait', 'nation', 'clubs', 'trait_team_color')
+
+
+@dataclass(frozen=True)
+class SearchSpec:
+    """카드 검색 조건 (요청 파라미터에서 한 번 만들고 SQL/인메모리 엔진/캐시 키가 같이 사용)
+
+    목록은 정렬·중복 제거된 tuple, 미지정 값은 None 이라 같은 조건이면 같은 객체가 된다.
+    """
+    player_names: tuple = ()        # ILIKE '%이름%' OR (소문자로 정규화)
+    seasons: tuple = ()             # season_id OR
+    positions: tuple = ()           # 선호 포지션 OR
+    min_ovr: int = None
+    max_ovr: int = None
+    min_salary: int = None
+    max_salary: int = None
+    preferred_foot: str = None      # 'L' / 'R'
+    weak_foot_min: int = None
+    min_height: int = None
+    max_height: int = None
+    min_weight: int = None
+    max_weight: int = None
+    body_types: tuple = ()          # 체형 OR
+    traits: tuple = ()              # 특성 AND
+    has_new_trait: bool = False     # 신규 특성 종류 무관 보유
+    nation: str = None              # 국가 팀컬러 (부분 일치)
+    clubs: tuple = ()               # 클럽 팀컬러 AND
+    trait_team_color: str = None    # 특성 팀컬러 이름
+
+    @classmethod
+    def from_args(cls, args):
+        """요청 파라미터 → SearchSpec (숫자 파라미터가 잘못되면 ValueError)"""
+        def text(key):
+            return args.get(key, '').strip() or None
+
+        def number(key):
+            value = args.get(key, '').strip()
+            return int(value) if value else None
+
+        def values(items):
+            return tuple(sorted({item for item in items if item}))
+
+        return cls(
+            player_names=values(name.strip().lower() for name in args.get('player_name', '').split(',')),
+            seasons=values(int(season) for season in args.getlist('seasons') if season),
+            positions=values(args.getlist('positions')),
+            min_ovr=number('min_ovr'),
+            max_ovr=number('max_ovr'),
+            min_salary=number('min_salary'),
+            max_salary=number('max_salary'),
+            preferred_foot={'left': 'L', 'right': 'R'}.get(args.get('preferred_foot', '')),
+            weak_foot_min=number('weak_foot_min'),
+            min_height=number('min_height'),
+            max_height=number('max_height'),
+            min_weight=number('min_weight'),
+            max_weight=number('max_weight'),
+            body_types=values(args.getlist('body_types')),
+            traits=values(args.get(key, '') for key in ('new_trait', 'normal_trait_1', 'normal_trait_2')),
+            has_new_trait=args.get('has_new_trait', '') == 'on',
+            nation=text('nation_team_color'),
+            clubs=values(args.get(key, '') for key in ('club_team_color_1', 'club_team_color_2')),
+            trait_team_color=text('trait_team_color'),
+        )
+
+    def without_membership(self):
+        """비트맵으로 해석한 멤버십 필터를 뺀 조건"""
+        return replace(self, **{name: SearchSpec.__dataclass_fields__[name].default for name in MEMBERSHIP_FIELDS})
+
+    def cache_key(self):
+        """지정된 조건만 담은 정규화된 JSON 문자열"""
+        spec = {name: list(value) if isinstance(value, tuple) else value
+                for name, value in asdict(self).items() if value not in ((), None, False)}
+        return json.dumps(spec, sort_keys=True, ensure_ascii=False)
+
+    def to_sql(self, card_spids=None):
+        """검색 조건 SQL 문자열과 파라미터
+
+        목록 조건은 개수와 무관하게 = ANY(%s) 배열 한 개로 바인딩해 쿼리 문장이 조건 종류별로 고정된다.
+        card_spids 는 비트맵 인덱스로 미리 구한 카드 집합.
+        """
+        conditions = ""
+        params = []
+
+        if card_spids is not None:
+            conditions += " AND player_cards.spid = ANY(%s)"
+            params.append(card_spids)
+
+        if self.player_names:
+            conditions += " AND player_name ILIKE ANY(%s)"
+            params.append([like_contains(name) for name in self.player_names])
+
+        if self.seasons:
+            conditions += " AND ca.season_id = ANY(%s)"
+            params.append(list(self.seasons))
+
+        if self.positions:
             conditions += """ AND EXISTS (
                 SELECT 1
-                FROM jsonb_array_elements_text(player_cards.full_data->'game_info'->'traits') AS trait
-                WHERE trait = %s
+                FROM jsonb_array_elements(
+                    player_cards.full_data->'stats_info'->'main_overall'->'preferred_positions'
+                ) AS pp
+                WHERE pp->>'position' = ANY(%s)
             )"""
-            params.append(trait)
-
-    # 신규 특성 종류 무관 보유 여부
-    if has_new_trait:
-        conditions += """ AND EXISTS (
-            SELECT 1
-            FROM jsonb_array_elements_text(player_cards.full_data->'game_info'->'traits') AS card_trait
-            WHERE card_trait IN (SELECT trait_name FROM player_traits WHERE trait_type = 'new')
-        )"""
-    
-    # 국가 팀컬러
-    if nation_team_color:
-        conditions += " AND player_cards.full_data->'basic_info'->>'nation' LIKE %s"
-        params.append(f'%{nation_team_color}%')
-    
-    # 클럽 팀컬러 1
-    if club_team_color_1:
-        conditions += """ AND EXISTS (
-           SELECT 1
-            FROM jsonb_array_elements(player_cards.full_data->'basic_info'->'club_history') AS club_hist
-            WHERE club_hist->>'club' = %s
-        )"""
-        params.append(club_team_color_1)
-    
-    # 클럽 팀컬러 2
-    if club_team_color_2:
-        conditions += """ AND EXISTS (
-            SELECT 1
-            FROM jsonb_array_elements(player_cards.full_data->'basic_info'->'club_history') AS club_hist
-            WHERE club_hist->>'club' = %s
-        )"""
-        params.append(club_team_color_2)
-    
-    # 특성 팀컬러
-    if trait_team_color:
-        conditions += """ AND RIGHT(player_cards.spid::text, 6) IN (
-            SELECT player_id
-            FROM special_teamcolor_players
-            WHERE teamcolor_id = (
-                SELECT id FROM special_teamcolors WHERE name = %s
-            )
-        )"""
-        params.append(trait_team_color)
-    
-    return conditions, params
+            params.append(list(self.positions))
+
+        for column, op, value in (
+            ('overall', '>=', self.min_ovr), ('overall', '<=', self.max_ovr),
+            ('ca.salary', '>=', self.min_salary), ('ca.salary', '<=', self.max_salary),
+            ('ca.weak_foot', '>=', self.weak_foot_min),
+            ('ca.height', '>=', self.min_height), ('ca.height', '<=', self.max_height),
+            ('ca.weight', '>=', self.min_weight), ('ca.weight', '<=', self.max_weight),
+        ):
+            if value is not None:
+                conditions += f" AND {column} {op} %s"
+                params.append(value)
+
+        if self.preferred_foot:
+            conditions += " AND ca.preferred_foot = %s"
+            params.append(self.preferred_foot)
+
+        if self.body_types:
+            conditions += " AND ca.body_type = ANY(%s)"
+            params.append(list(self.body_types))
+
+        # 특성: 모두 보유
+        if self.traits:
+            conditions += " AND player_cards.full_data->'game_info'->'traits' ?& %s::text[]"
+            params.append(list(self.traits))
+
+        if self.has_new_trait:
+            conditions += """ AND EXISTS (
+                SELECT 1
+                FROM jsonb_array_elements_text(player_cards.full_data->'game_info'->'traits') AS card_trait
+                WHERE card_trait IN (SELECT trait_name FROM player_traits WHERE trait_type = 'new')
+            )"""
+
+        if self.nation:
+            conditions += " AND ca.nation LIKE %s"
+            params.append(like_contains(self.nation))
+
+        # 클럽 팀컬러: 모든 클럽을 이력에 보유
+        if self.clubs:
+            conditions += """ AND (
+                SELECT COUNT(DISTINCT club_hist->>'club')
+                FROM jsonb_array_elements(player_cards.full_data->'basic_info'->'club_history') AS club_hist
+                WHERE club_hist->>'club' = ANY(%s)
+            ) = %s"""
+            params += [list(self.clubs), len(self.clubs)]
+
+        if self.trait_team_color:
+            conditions += """ AND ca.pid IN (
+                SELECT player_id
+                FROM special_teamcolor_players
+                WHERE teamcolor_id = (
+                    SELECT id FROM special_teamcolors WHERE name = %s
+                )
+            )"""
+            params.append(self.trait_team_color)
+
+        return conditions, params
+
+
+# 검색 결과 카드 컬럼 (SQL 경로와 인메모리 엔진이 같은 목록 사용)
+SEARCH_RESULT_COLUMNS = """
+    player_cards.spid, player_name, season_name, overall, position,
+    COALESCE(full_data->'image_info'->>'mini_faceon', full_data->'image_info'->>'mini_faceon_high') as image,
+    full_data->'image_info'->>'mini_faceon_high' as image_high,
+    full_data->'image_info'->>'season_img' as season_img,
+    full_data->'game_info'->>'salary' as salary,
+    full_data->'basic_info'->>'nation' as nation,
+    full_data->'stats_info'->'main_overall'->'preferred_positions' as preferred_positions,
+    full_data->'game_info'->>'preferred_foot' as preferred_foot,
+    full_data->'game_info'->>'weak_foot' as weak_foot,
+    full_data->'basic_info'->>'height' as height,
+    full_data->'basic_info'->>'weight' as weight,
+    full_data->'basic_info'->>'body_type' as body_type,
+    full_data->'game_info'->>'skill_moves' as skill_moves,
+    full_data->'game_info'->'traits' as traits,
+    boost_change
+"""
+
+
+SEARCH_SORT_MODES = ('overall', 'salary', 'price', 'position', 'season')
+
+
+@dataclass(frozen=True)
+class SearchSort:
+    """검색 정렬 방식
+
+    overall: overall DESC, player_name, spid (기본)
+    salary / price / season: 급여, 강화 단계별 현재 가격(card_prices.bp1~13), 시즌 순서 오름차순
+    position: 포지션별 오버롤(stats_info.position_overall) 내림차순
+    기본 외에는 (정렬 키, spid) 순이며 키가 없는 카드는 맨 뒤. 정렬 키마다 인덱스가 있다.
+    """
+    mode: str = 'overall'
+    boost: int = None       # price: 강화 단계 1~13
+    position: str = None    # position: 포지션 (기본은 선택한 첫 포지션)
+
+    @classmethod
+    def from_args(cls, args, spec):
+        """요청 파라미터(sort, sort_bp, sort_pos) → SearchSort (잘못된 값이면 ValueError)"""
+        mode = args.get('sort', '') or 'overall'
+        if mode not in SEARCH_SORT_MODES:
+            raise ValueError('invalid sort')
+        if mode == 'price':
+            boost = int(args.get('sort_bp', '') or 1)
+            if not 1 <= boost <= 13:
+                raise ValueError('invalid boost')
+            return cls(mode, boost=boost)
+        if mode == 'position':
+            position = args.get('sort_pos', '').strip() or (spec.positions[0] if spec.positions else '')
+            if not position:
+                raise ValueError('position required')
+            return cls(mode, position=position)
+        return cls(mode)
+
+    @property
+    def is_default(self):
+        return self.mode == 'overall'
+
+    def cache_key(self):
+        return ':'.join(str(part) for part in (self.mode, self.boost, self.position) if part is not None)
+
+    def key_sql(self):
+        return {
+            'salary': 'ca.salary',
+            'price': f'cp.bp{self.boost}',
+            'position': 'cpo.overall',
+            'season': 'ca.season_rank',
+        }[self.mode]
+
+    def join_sql(self):
+        """정렬 키용 JOIN 과 파라미터"""
+        if self.mode == 'price':
+            return " LEFT JOIN card_prices cp ON cp.spid = player_cards.spid", []
+        if self.mode == 'position':
+            return (" LEFT JOIN card_position_overall cpo"
+                    " ON cpo.spid = player_cards.spid AND cpo.position = %s"), [self.position]
+        return "", []
+
+    def order_sql(self):
+        if self.is_default:
+            return "overall DESC, player_name, player_cards.spid"
+        direction = 'DESC' if self.mode == 'position' else 'ASC'
+        return f"{self.key_sql()} {direction} NULLS LAST, player_cards.spid"
+
+    def after_sql(self, after):
+        """keyset 조건: after 다음 행부터"""
+        if self.is_default:
+            overall, player_name, spid = after
+            if overall is None:
+                # overall DESC 는 NULL 이 먼저 오므로 NULL 다음은 NULL 내 후속 행 + 나머지 전부
+                return """ AND (
+                    overall IS NOT NULL
+                    OR player_name > %s OR (player_name = %s AND player_cards.spid > %s)
+                )""", [player_name, player_name, spid]
+            return """ AND (
+                overall < %s
+                OR (overall = %s AND (player_name > %s OR (player_name = %s AND player_cards.spid > %s)))
+            )""", [overall, overall, player_name, player_name, spid]
+
+        value, spid = after
+        key = self.key_sql()
+        if value is None:
+            return f" AND {key} IS NULL AND player_cards.spid > %s", [spid]
+        op = '<' if self.mode == 'position' else '>'
+        return (f" AND ({key} {op} %s OR ({key} = %s AND player_cards.spid > %s) OR {key} IS NULL)",
+                [value, value, spid])
+
+    def cursor_key(self, card):
+        if self.is_default:
+            return [card['overall'], card['player_name'], card['spid']]
+        value = card['sort_value']
+        if value is not None and not isinstance(value, int):
+            value = int(value) if value == int(value) else float(value)
+        return [self.cache_key(), value, card['spid']]
+
+
+DEFAULT_SEARCH_SORT = SearchSort()
+
+
+def encode_search_cursor(card, sort=DEFAULT_SEARCH_SORT):
+    """검색 정렬 키 → 불투명 커서 토큰"""
+    raw = json.dumps(sort.cursor_key(card), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_search_cursor(token, sort=DEFAULT_SEARCH_SORT):
+    """커서 토큰 → 기본 정렬은 (overall, player_name, spid), 그 외 (정렬 키, spid)
+
+    없으면 None, 잘못된 토큰이거나 정렬 방식이 다르면 ValueError
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        first, second, spid = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('invalid cursor')
+    if not isinstance(spid, int):
+        raise ValueError('invalid cursor')
+    if sort.is_default:
+        if not isinstance(first, (int, type(None))) or not isinstance(second, str):
+            raise ValueError('invalid cursor')
+        return first, second, spid
+    if first != sort.cache_key() or not isinstance(second, (int, float, type(None))):
+        raise ValueError('invalid cursor')
+    return second, spid
+
+
+def build_search_query(spec, bitmap_index=None, after=None, sort=DEFAULT_SEARCH_SORT):
+    """검색 WHERE 조건 + 파라미터
+
+    bitmap_index 가 있으면 멤버십 필터를 비트맵으로 카드 집합으로 바꿔 spid = ANY 로 넘긴다.
+    after 가 있으면 sort 의 keyset 조건을 붙인다.
+    """
+    card_spids = None
+    if bitmap_index is not None:
+        bits = bitmap_index.resolve(spec)
+        if bits is not None:
+            spec, card_spids = spec.without_membership(), bitmap_index.to_spids(bits).tolist()
+    search_conditions, search_params = spec.to_sql(card_spids)
+
+    page_conditions, page_params = search_conditions, list(search_params)
+    if after is not None:
+        after_conditions, after_params = sort.after_sql(after)
+        page_conditions += after_conditions
+        page_params += after_params
+    return search_conditions, search_params, page_conditions, page_params
+
+
+def search_page_query(sort, page_conditions, page_params, limit):
+    """정렬된 검색 페이지 쿼리와 파라미터"""
+    join, join_params = sort.join_sql()
+    sort_column = "" if sort.is_default else f", {sort.key_sql()} AS sort_value"
+    query = f"""
+        SELECT {SEARCH_RESULT_COLUMNS} {sort_column}
+        FROM {SEARCH_FROM}{join}
+        WHERE 1=1 {page_conditions}
+        ORDER BY {sort.order_sql()}
+        LIMIT %s
+    """
+    return query, join_params + page_params + [limit]
+
+
+def search_cards_sql(cur, spec, limit, bitmap_index=None, after=None, with_count=True, sort=DEFAULT_SEARCH_SORT):
+    """DB 검색 경로: (전체 개수, after 다음 limit 개 카드). with_count=False 면 개수는 None"""
+    search_conditions, search_params, page_conditions, page_params = build_search_query(
+        spec, bitmap_index, after, sort)
+
+    total_count = None
+    if with_count:
+        count_query = f"SELECT COUNT(*) FROM {SEARCH_FROM} WHERE 1=1" + search_conditions
+        cur.execute(count_query, search_params)
+        total_count = cur.fetchone()['count']
+
+    cur.execute(*search_page_query(sort, page_conditions, page_params, limit))
+    return total_count, cur.fetchall()
+
+
+# 패싯 집계 (현재 조건에 맞는 카드 집합을 한 번만 읽어 종류별로 GROUP BY)
+SEARCH_FACET_OVR_BUCKET = 5  # 오버롤 구간 폭
+
+SEARCH_FACETS_QUERY = f"""
+    WITH matched AS MATERIALIZED (
+        SELECT player_cards.spid, overall, ca.season_id, ca.body_type, ca.nation,
+               player_cards.full_data->'stats_info'->'main_overall'->'preferred_positions' AS positions,
+               player_cards.full_data->'game_info'->'traits' AS traits
+        FROM {SEARCH_FROM}
+        WHERE 1=1 {{conditions}}
+    )
+    SELECT 'season' AS facet, season_id::text AS value, COUNT(*) AS count
+    FROM matched GROUP BY season_id
+    UNION ALL
+    SELECT 'body_type', body_type, COUNT(*)
+    FROM matched WHERE body_type IS NOT NULL GROUP BY body_type
+    UNION ALL
+    SELECT 'nation', nation, COUNT(*)
+    FROM matched WHERE nation <> '' GROUP BY nation
+    UNION ALL
+    SELECT 'ovr', (FLOOR(overall / %s) * %s)::int::text, COUNT(*)
+    FROM matched WHERE overall IS NOT NULL GROUP BY 2
+    UNION ALL
+    SELECT 'position', pp->>'position', COUNT(DISTINCT spid)
+    FROM matched, jsonb_array_elements(positions) AS pp GROUP BY 2
+    UNION ALL
+    SELECT 'trait', trait, COUNT(DISTINCT spid)
+    FROM matched, jsonb_array_elements_text(traits) AS trait GROUP BY 2
+"""
+
+SEARCH_FACET_NAMES = ('season', 'position', 'body_type', 'trait', 'nation', 'ovr')
+
+
+def search_facets_sql(cur, spec, bitmap_index=None):
+    """DB 검색 경로의 패싯: {'season': {'100': 개수, ...}, 'position': {...}, ...}"""
+    search_conditions, search_params, _, _ = build_search_query(spec, bitmap_index)
+    cur.execute(SEARCH_FACETS_QUERY.format(conditions=search_conditions),
+                search_params + [SEARCH_FACET_OVR_BUCKET, SEARCH_FACET_OVR_BUCKET])
+    facets = {name: {} for name in SEARCH_FACET_NAMES}
+    for row in cur.fetchall():
+        facets[row['facet']][row['value']] = row['count']
+    return facets
+
+
+def fetch_trait_teamcolor_info(cur, trait_team_color):
+    """특성 팀컬러 효과 (없으면 None)"""
+    cur.execute(
+        "SELECT name, min_count, stat1_name, stat1_value, stat2_name, stat2_value, "
+        "stat3_name, stat3_value, stat4_name, stat4_value "
+        "FROM teamcolor_effects WHERE name = %s AND type = '특성'",
+        (trait_team_color,)
+    )
+    effect = cur.fetchone()
+    return format_teamcolor_info(effect) if effect else None
+
+
+def format_teamcolor_info(effect):
+    """teamcolor_effects 행 → 검색 결과용 팀컬러 정보"""
+    stats = []
+    for i in range(1, 5):
+        stat_name = effect[f'stat{i}_name']
+        stat_value = effect[f'stat{i}_value']
+        if stat_name and stat_value is not None:
+            stats.append({'name': stat_name, 'value': stat_value})
+    return {
+        'name': effect['name'],
+        'min_count': effect['min_count'],
+        'stats': stats
+    }
+
+# 데이터 버전: 크롤러가 테이블을 갱신하면 문장 단위 트리거가 버전을 올림 (캐시/인메모리 엔진 무효화용)
+SCHEMA_DDL.append("""
+    CREATE TABLE IF NOT EXISTS data_versions (
+        name TEXT PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    INSERT INTO data_versions (name) VALUES ('cards'), ('prices') ON CONFLICT DO NOTHING;
+
+    CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+    BEGIN
+        UPDATE data_versions SET version = version + 1, updated_at = now() WHERE name = TG_ARGV[0];
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS player_cards_version ON player_cards;
+    CREATE TRIGGER player_cards_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON player_cards
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('cards');
+    DROP TRIGGER IF EXISTS special_teamcolor_players_version ON special_teamcolor_players;
+    CREATE TRIGGER special_teamcolor_players_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON special_teamcolor_players
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('cards');
+    DROP TRIGGER IF EXISTS season_order_version ON season_order;
+    CREATE TRIGGER season_order_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON season_order
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('cards');
+    DROP TRIGGER IF EXISTS player_traits_version ON player_traits;
+    CREATE TRIGGER player_traits_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON player_traits
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('cards');
+
+    -- 시세는 카드 데이터와 별도 버전 (가격 정렬 결과, 카드 문서 캐시 무효화용)
+    DROP TRIGGER IF EXISTS card_prices_version ON card_prices;
+    CREATE TRIGGER card_prices_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON card_prices
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('prices');
+    DROP TRIGGER IF EXISTS card_price_history_version ON card_price_history;
+    CREATE TRIGGER card_price_history_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON card_price_history
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('prices');
+""")
+
+
+DATA_VERSION_CHECK_INTERVAL = float(os.getenv('DATA_VERSION_CHECK_INTERVAL', 60))  # 데이터 버전 확인 주기(초)
+_data_version_cache = {}
+
+
+def get_data_version(cur, name):
+    """data_versions 의 현재 버전 (행이 없으면 None)"""
+    cur.execute("SELECT version FROM data_versions WHERE name = %s", (name,))
+    row = cur.fetchone()
+    return row['version'] if row else None
+
+
+def current_data_version(name):
+    """워커별로 DATA_VERSION_CHECK_INTERVAL 초 동안 캐시한 데이터 버전"""
+    now = time.monotonic()
+    cached = _data_version_cache.get(name)
+    if cached and now - cached[1] < DATA_VERSION_CHECK_INTERVAL:
+        return cached[0]
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            version = get_data_version(cur, name)
+    finally:
+        conn.close()
+    _data_version_cache[name] = (version, now)
+    return version
+
+
+class LRUCache:
+    """스레드 안전 LRU 캐시 (항목 수/바이트 상한 + TTL, 데이터 버전이 바뀌면 전체 무효화)"""
+
+    def __init__(self, max_entries, ttl, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()   # key → (만료 시각, 크기, 값)
+        self._lock = threading.Lock()
+        self.version = None
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _sync_version(self, version):
+        if version != self.version:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self.bytes = 0
+            self.version = version
+
+    def get(self, key, version=None):
+        with self._lock:
+            self._sync_version(version)
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def set(self, key, value, version=None, size=None):
+        if size is None:
+            size = len(value) if isinstance(value, (bytes, str)) else 1
+        with self._lock:
+            self._sync_version(version)
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, size, value)
+            self.bytes += size
+            while self._data and (len(self._data) > self.max_entries
+                                  or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._data),
+                'bytes': self.bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+# 인메모리 검색 인덱스 (numpy 필요, 없으면 SQL 경로만 사용)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SEARCH_ENGINE = os.getenv('SEARCH_ENGINE', 'sql')                  # 'memory' 이면 인메모리 필터 엔진 사용
+CARD_BITMAP_INDEX = os.getenv('CARD_BITMAP_INDEX', '1') == '1'      # SQL 경로의 멤버십 필터를 비트맵으로 해석
+
+# 카드별 멤버십 값 (포지션/특성/클럽 이력/국가/pid)
+CARD_MEMBERSHIP_COLUMNS = """
+    ARRAY(
+        SELECT pp->>'position'
+        FROM jsonb_array_elements(player_cards.full_data->'stats_info'->'main_overall'->'preferred_positions') AS pp
+    ) AS f_positions,
+    ARRAY(
+        SELECT jsonb_array_elements_text(player_cards.full_data->'game_info'->'traits')
+    ) AS f_traits,
+    ARRAY(
+        SELECT club_hist->>'club'
+        FROM jsonb_array_elements(player_cards.full_data->'basic_info'->'club_history') AS club_hist
+    ) AS f_clubs,
+    ca.nation AS f_nation,
+    ca.pid AS f_pid
+"""
+
+CARD_BITMAP_LOAD_QUERY = f"""
+    SELECT player_cards.spid, {CARD_MEMBERSHIP_COLUMNS}
+    FROM {SEARCH_FROM}
+"""
+
+
+def load_membership_extras(cur):
+    """비트맵 인덱스에 필요한 신규 특성 목록, 특성 팀컬러별 pid 목록"""
+    cur.execute("SELECT trait_name FROM player_traits WHERE trait_type = 'new'")
+    new_traits = [row['trait_name'] for row in cur.fetchall()]
+    cur.execute("""
+        SELECT st.name, stp.player_id
+        FROM special_teamcolor_players stp
+        JOIN special_teamcolors st ON st.id = stp.teamcolor_id
+    """)
+    teamcolor_players = {}
+    for row in cur.fetchall():
+        teamcolor_players.setdefault(row['name'], []).append(row['player_id'])
+    return new_traits, teamcolor_players
+
+
+# 바이트별 1 비트 개수 (비트셋 popcount 용)
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8) if np is not None else None
+
+
+class CardBitmapIndex:
+    """카드 서수 위 멤버십 비트맵 인덱스 (포지션/특성/클럽/국가/특성 팀컬러)
+
+    카드 수가 적은 값은 서수 배열, 많은 값은 packbits 비트셋으로 저장한다 (roaring 식 컨테이너 선택).
+    """
+
+    FIELDS = ('position', 'trait', 'club', 'nation', 'teamcolor')
+
+    def __init__(self, rows, new_traits, teamcolor_players, version):
+        self.version = version
+        self.spid = np.array([r['spid'] for r in rows], dtype=np.int64)
+        self.size = len(rows)
+        self._nbytes = (self.size + 7) // 8
+
+        groups = {field: {} for field in self.FIELDS}
+        pid_ordinals = {}
+        for i, r in enumerate(rows):
+            for pos in set(r['f_positions'] or []):
+                groups['position'].setdefault(pos, []).append(i)
+            for trait in set(r['f_traits'] or []):
+                groups['trait'].setdefault(trait, []).append(i)
+            for club in set(r['f_clubs'] or []):
+                groups['club'].setdefault(club, []).append(i)
+            if r['f_nation']:
+                groups['nation'].setdefault(r['f_nation'], []).append(i)
+            pid_ordinals.setdefault(r['f_pid'], []).append(i)
+        for name, pids in teamcolor_players.items():
+            groups['teamcolor'][name] = [i for pid in set(pids) for i in pid_ordinals.get(pid, [])]
+
+        self.bitmaps = {
+            field: {key: self._compress(ordinals) for key, ordinals in values.items()}
+            for field, values in groups.items()
+        }
+        self.new_trait_bits = self.any_of('trait', new_traits)
+
+    def _bits_from_ordinals(self, ordinals):
+        mask = np.zeros(self.size, dtype=bool)
+        mask[ordinals] = True
+        return np.packbits(mask)
+
+    def _compress(self, ordinals):
+        ordinals = np.unique(np.array(ordinals, dtype=np.int32))
+        # 서수 배열(카드당 4바이트)이 비트셋보다 작으면 배열 컨테이너 유지
+        if len(ordinals) * 4 < self._nbytes:
+            return ordinals
+        return self._bits_from_ordinals(ordinals)
+
+    def any_of(self, field, keys):
+        """keys 중 하나라도 가진 카드 비트셋 (OR)"""
+        bits = np.zeros(self._nbytes, dtype=np.uint8)
+        sparse = []
+        for key in keys:
+            container = self.bitmaps[field].get(key)
+            if container is None:
+                continue
+            if container.dtype == np.uint8:
+                bits |= container
+            else:
+                sparse.append(container)
+        if sparse:
+            bits |= self._bits_from_ordinals(np.concatenate(sparse))
+        return bits
+
+    def counts(self, field, mask):
+        """mask 안에서 field 의 값별 카드 수 (0 인 값은 제외)"""
+        packed = np.packbits(mask)
+        result = {}
+        for key, container in self.bitmaps[field].items():
+            if container.dtype == np.uint8:
+                count = int(POPCOUNT_TABLE[container & packed].sum())
+            else:
+                count = int(np.count_nonzero(mask[container]))
+            if count:
+                result[key] = count
+        return result
+
+    def all_of(self, field, keys):
+        """keys 를 모두 가진 카드 비트셋 (AND)"""
+        return np.bitwise_and.reduce([self.any_of(field, [key]) for key in keys])
+
+    def resolve(self, spec):
+        """SearchSpec 의 멤버십 필터 → 비트셋 (해당 필터가 하나도 없으면 None)"""
+        parts = []
+        if spec.positions:
+            parts.append(self.any_of('position', spec.positions))
+        if spec.traits:
+            parts.append(self.all_of('trait', spec.traits))
+        if spec.has_new_trait:
+            parts.append(self.new_trait_bits)
+        if spec.nation:
+            # LIKE '%국가%' 와 동일하게 부분 일치하는 국가 값들의 OR
+            nations = [n for n in self.bitmaps['nation'] if spec.nation in n]
+            parts.append(self.any_of('nation', nations))
+        if spec.clubs:
+            parts.append(self.all_of('club', spec.clubs))
+        if spec.trait_team_color:
+            parts.append(self.any_of('teamcolor', [spec.trait_team_color]))
+        if not parts:
+            return None
+        return np.bitwise_and.reduce(parts)
+
+    def to_mask(self, bits):
+        return np.unpackbits(bits, count=self.size).astype(bool)
+
+    def to_spids(self, bits):
+        return self.spid[self.to_mask(bits)]
+
+    def stats(self):
+        result = {'cards': self.size, 'version': self.version}
+        for field, values in self.bitmaps.items():
+            result[field] = {
+                'keys': len(values),
+                'bytes': int(sum(c.nbytes for c in values.values())),
+                'bitset_containers': sum(1 for c in values.values() if c.dtype == np.uint8),
+            }
+        return result
+
+
+class SnapshotLoader:
+    """DB 에서 만든 읽기 전용 스냅샷을 워커 메모리에 두고, 데이터 버전이 바뀌면 백그라운드로 교체
+
+    build(cur, version) 이 스냅샷을 만들어 반환 (스냅샷은 .version 속성을 가짐)
+    """
+
+    def __init__(self, enabled, build, version_name='cards', requires_numpy=True):
+        self.enabled = enabled and (np is not None or not requires_numpy)
+        self.build = build
+        self.version_name = version_name
+        self._snapshot = None
+        self._lock = threading.Lock()
+        self._loading = False
+        self.load_count = 0
+        self.last_error = None
+
+    def get_snapshot(self):
+        """현재 스냅샷 반환. 없거나 데이터 버전이 바뀌었으면 백그라운드 재적재 시작"""
+        if not self.enabled:
+            return None
+        snapshot = self._snapshot
+        if snapshot is None or current_data_version(self.version_name) != snapshot.version:
+            self._start_reload()
+        return snapshot
+
+    def _start_reload(self):
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+        threading.Thread(target=self._reload_in_background, daemon=True).start()
+
+    def _reload_in_background(self):
+        try:
+            self.reload()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"{self.build.__name__} 적재 오류: {e}")
+        finally:
+            self._loading = False
+
+    def reload(self):
+        """DB 에서 스냅샷을 새로 만들어 교체 (크롤링 후 재적재 훅)"""
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                version = get_data_version(cur, self.version_name)
+                snapshot = self.build(cur, version)
+        finally:
+            conn.close()
+
+        self._snapshot = snapshot
+        self.load_count += 1
+        self.last_error = None
+        return snapshot
+
+
+def build_card_bitmap_index(cur, version):
+    """SQL 검색 경로용 비트맵 인덱스"""
+    cur.execute(CARD_BITMAP_LOAD_QUERY)
+    rows = cur.fetchall()
+    new_traits, teamcolor_players = load_membership_extras(cur)
+    return CardBitmapIndex(rows, new_traits, teamcolor_players, version)
+
+
+CARD_ENGINE_LOAD_QUERY = f"""
+    SELECT {SEARCH_RESULT_COLUMNS},
+           ca.season_id AS f_season_id,
+           ca.salary AS f_salary,
+           ca.height AS f_height,
+           ca.weight AS f_weight,
+           ca.weak_foot AS f_weak_foot,
+           ca.preferred_foot AS f_preferred_foot,
+           DENSE_RANK() OVER (ORDER BY player_name) AS f_name_rank,
+           {CARD_MEMBERSHIP_COLUMNS}
+    FROM {SEARCH_FROM}
+"""
+
+
+class CardSnapshot:
+    """검색 필터용 컬럼 배열 스냅샷 (읽기 전용, 재적재 시 통째로 교체)"""
+
+    def __init__(self, rows, bitmap, teamcolor_effects, version):
+        self.version = version
+        self.loaded_at = datetime.now(pytz.UTC)
+        self.size = len(rows)
+        self.bitmap = bitmap
+        self.teamcolor_info = teamcolor_effects
+
+        def column(key, dtype=np.float64):
+            # NULL 은 NaN → 비교 연산이 항상 False (SQL 과 동일)
+            return np.array([np.nan if r[key] is None else r[key] for r in rows], dtype=dtype)
+
+        self.spid = bitmap.spid
+        self.overall = column('overall')
+        self.season_id = np.array([r['f_season_id'] for r in rows], dtype=np.int32)
+        self.salary = column('f_salary')
+        self.height = column('f_height')
+        self.weight = column('f_weight')
+        self.weak_foot = column('f_weak_foot')
+        self.preferred_foot = np.array([r['f_preferred_foot'] or '' for r in rows], dtype='<U1')
+        self.name_codes, self.names = self._encode([r['player_name'] or '' for r in rows])
+        self.names_lower = np.array([n.lower() for n in self.names], dtype=str)
+        self.body_type_codes, self.body_types = self._encode([r['body_type'] for r in rows])
+        self.rows = [{k: v for k, v in r.items() if not k.startswith('f_')} for r in rows]
+
+        # 정렬 순서 (overall DESC NULLS FIRST, player_name, spid) 를 미리 계산
+        # 이름 순위는 DB 콜레이션 기준 (DENSE_RANK) 으로 받아 SQL 정렬과 일치시킴
+        name_rank = np.array([r['f_name_rank'] for r in rows], dtype=np.int64)
+        overall_key = np.where(np.isnan(self.overall), -np.inf, -self.overall)
+        self.order = np.lexsort((self.spid, name_rank, overall_key))
+        self.order_position = np.empty(self.size, dtype=np.int64)
+        self.order_position[self.order] = np.arange(self.size)
+        self.spid_sort = np.argsort(self.spid)
+
+    def position_after(self, after):
+        """커서 행의 정렬 위치 (스냅샷에 없거나 정렬 키가 바뀌었으면 None)"""
+        overall, player_name, spid = after
+        i = int(np.searchsorted(self.spid, spid, sorter=self.spid_sort))
+        if i >= self.size:
+            return None
+        ordinal = self.spid_sort[i]
+        row = self.rows[ordinal]
+        if row['spid'] != spid or row['overall'] != overall or row['player_name'] != player_name:
+            return None
+        return int(self.order_position[ordinal])
+
+    @staticmethod
+    def _encode(values):
+        labels = sorted({v for v in values if v is not None})
+        index = {v: i for i, v in enumerate(labels)}
+        codes = np.array([index.get(v, -1) for v in values], dtype=np.int32)
+        return codes, labels
+
+
+def build_card_snapshot(cur, version):
+    """인메모리 검색 엔진용 CardSnapshot"""
+    cur.execute(CARD_ENGINE_LOAD_QUERY)
+    rows = cur.fetchall()
+    new_traits, teamcolor_players = load_membership_extras(cur)
+    cur.execute(
+        "SELECT name, min_count, stat1_name, stat1_value, stat2_name, stat2_value, "
+        "stat3_name, stat3_value, stat4_name, stat4_value "
+        "FROM teamcolor_effects WHERE type = '특성'"
+    )
+    teamcolor_effects = {}
+    for row in cur.fetchall():
+        teamcolor_effects.setdefault(row['name'], format_teamcolor_info(row))
+    bitmap = CardBitmapIndex(rows, new_traits, teamcolor_players, version)
+    return CardSnapshot(rows, bitmap, teamcolor_effects, version)
+
+
+class CardFilterEngine(SnapshotLoader):
+    """SearchSpec 의 모든 필터를 NumPy 마스크로 평가하는 인메모리 검색 엔진"""
+
+    def __init__(self, enabled):
+        super().__init__(enabled, build_card_snapshot)
+
+    def filter_mask(self, snap, spec):
+        """SearchSpec → 카드 마스크 (SearchSpec.to_sql 과 같은 의미)"""
+        mask = np.ones(snap.size, dtype=bool)
+
+        # 선수 이름 (ILIKE '%이름%' OR)
+        if spec.player_names:
+            matched = np.zeros(len(snap.names), dtype=bool)
+            for name in spec.player_names:
+                matched |= np.char.find(snap.names_lower, name) >= 0
+            mask &= matched[snap.name_codes]
+
+        if spec.seasons:
+            mask &= np.isin(snap.season_id, spec.seasons)
+
+        for value, column, op in (
+            (spec.min_ovr, snap.overall, np.greater_equal), (spec.max_ovr, snap.overall, np.less_equal),
+            (spec.min_salary, snap.salary, np.greater_equal), (spec.max_salary, snap.salary, np.less_equal),
+            (spec.weak_foot_min, snap.weak_foot, np.greater_equal),
+            (spec.min_height, snap.height, np.greater_equal), (spec.max_height, snap.height, np.less_equal),
+            (spec.min_weight, snap.weight, np.greater_equal), (spec.max_weight, snap.weight, np.less_equal),
+        ):
+            if value is not None:
+                mask &= op(column, value)
+
+        if spec.preferred_foot:
+            mask &= snap.preferred_foot == spec.preferred_foot
+
+        if spec.body_types:
+            codes = [i for i, b in enumerate(snap.body_types) if b in spec.body_types]
+            mask &= np.isin(snap.body_type_codes, codes)
+
+        # 포지션/특성/국가/클럽/특성 팀컬러는 비트맵 인덱스로 해석
+        bits = snap.bitmap.resolve(spec)
+        if bits is not None:
+            mask &= snap.bitmap.to_mask(bits)
+
+        return mask
+
+    def facets(self, snap, mask):
+        """마스크에 걸린 카드의 패싯 (search_facets_sql 과 같은 형식)"""
+        def value_counts(values):
+            keys, counts = np.unique(values, return_counts=True)
+            return {str(int(k)): int(c) for k, c in zip(keys, counts)}
+
+        body_codes = snap.body_type_codes[mask]
+        overall = snap.overall[mask]
+        overall = overall[~np.isnan(overall)]
+        return {
+            'season': value_counts(snap.season_id[mask]),
+            'position': snap.bitmap.counts('position', mask),
+            'body_type': {snap.body_types[int(k)]: int(c)
+                          for k, c in zip(*np.unique(body_codes[body_codes >= 0], return_counts=True))},
+            'trait': snap.bitmap.counts('trait', mask),
+            'nation': snap.bitmap.counts('nation', mask),
+            'ovr': value_counts(np.floor(overall / SEARCH_FACET_OVR_BUCKET) * SEARCH_FACET_OVR_BUCKET),
+        }
+
+    def search(self, snap, spec, limit, after=None, mask=None):
+        """(전체 개수, overall DESC, player_name, spid 순으로 after 다음 limit 개 카드)
+
+        커서 행이 스냅샷에 없으면 None (호출 측에서 SQL 경로로 처리). mask 를 넘기면 필터 평가 생략
+        """
+        start = 0
+        if after is not None:
+            position = snap.position_after(after)
+            if position is None:
+                return None
+            start = position + 1
+        if mask is None:
+            mask = self.filter_mask(snap, spec)
+        total_count = int(np.count_nonzero(mask))
+        candidates = snap.order[start:]
+        top = candidates[mask[candidates]][:limit]
+        return total_count, [snap.rows[i] for i in top]
+
+
+card_engine = CardFilterEngine(SEARCH_ENGINE == 'memory')
+# 인메모리 엔진을 쓰면 엔진 스냅샷에 비트맵이 포함되므로 별도 적재하지 않음
+card_bitmaps = SnapshotLoader(CARD_BITMAP_INDEX and not card_engine.enabled, build_card_bitmap_index)
+
+
+# 선수 이름 검색: 'memory' 면 워커 메모리의 n-gram 인덱스(초성/오타 허용), 'db' 면 pg_trgm 인덱스를 타는 ILIKE
+PLAYER_NAME_INDEX = os.getenv('PLAYER_NAME_INDEX', 'memory')
+
+SCHEMA_DDL.append("""
+    CREATE INDEX IF NOT EXISTS player_cards_player_name_trgm_idx
+        ON player_cards USING gin (player_name gin_trgm_ops);
+""")
+
+PLAYER_NAME_LOAD_QUERY = """
+    SELECT player_name,
+           COUNT(*) AS card_count,
+           array_agg(spid ORDER BY overall DESC, spid) AS spids,
+           array_agg(overall ORDER BY overall DESC, spid) AS overalls
+    FROM player_cards
+    WHERE player_name IS NOT NULL
+    GROUP BY player_name
+    ORDER BY player_name
+"""
+
+
+HANGUL_CHOSUNG = 'ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ'
+HANGUL_JUNGSUNG = 'ㅏㅐㅑㅒㅓㅔㅕㅖㅗㅘㅙㅚㅛㅜㅝㅞㅟㅠㅡㅢㅣ'
+HANGUL_JONGSUNG = ('', 'ㄱ', 'ㄲ', 'ㄳ', 'ㄴ', 'ㄵ', 'ㄶ', 'ㄷ', 'ㄹ', 'ㄺ', 'ㄻ', 'ㄼ', 'ㄽ', 'ㄾ', 'ㄿ', 'ㅀ',
+                   'ㅁ', 'ㅂ', 'ㅄ', 'ㅅ', 'ㅆ', 'ㅇ', 'ㅈ', 'ㅊ', 'ㅋ', 'ㅌ', 'ㅍ', 'ㅎ')
+
+
+def hangul_chosung(text):
+    """한글 음절을 초성으로 바꾼 문자열 (글자 수 유지, 한글 외 문자는 그대로)"""
+    chars = []
+    for ch in text:
+        code = ord(ch) - 0xAC00
+        chars.append(HANGUL_CHOSUNG[code // 588] if 0 <= code < 11172 else ch)
+    return ''.join(chars)
+
+
+def hangul_jamo(text):
+    """한글 음절을 자모 단위로 분해한 문자열 ('손' → 'ㅅㅗㄴ')"""
+    chars = []
+    for ch in text:
+        code = ord(ch) - 0xAC00
+        if 0 <= code < 11172:
+            chars.append(HANGUL_CHOSUNG[code // 588])
+            chars.append(HANGUL_JUNGSUNG[code % 588 // 28])
+            chars.append(HANGUL_JONGSUNG[code % 28])
+        else:
+            chars.append(ch)
+    return ''.join(chars)
+
+
+def substring_edit_distance(pattern, text, max_dist):
+    """text 의 임의 부분 문자열과 pattern 사이 최소 편집 거리 (max_dist 초과 시 max_dist + 1)"""
+    prev = list(range(len(pattern) + 1))
+    best = prev[-1]
+    for ch in text:
+        cur = [0]
+        for i, pc in enumerate(pattern, 1):
+            cur.append(min(prev[i] + 1, cur[i - 1] + 1, prev[i - 1] + (pc != ch)))
+        best = min(best, cur[-1])
+        if best == 0:
+            return 0
+        prev = cur
+    return best if best <= max_dist else max_dist + 1
+
+
+# 오타 허용 검색에서 편집 거리를 계산할 이름 수 상한 (짧은 검색어가 이름 대부분을 훑지 않도록)
+FUZZY_MAX_CANDIDATES = int(os.getenv('FUZZY_MAX_CANDIDATES', 500))
+
+
+class PlayerNameMatcher:
+    """선수 이름 n-gram(1/2글자) 인덱스 — 원문 부분 문자열 → 초성('ㅅㅎㅁ') → 자모 편집 거리 순으로 찾는다"""
+
+    def __init__(self, names):
+        # 이름 id = names 순서 (DB 콜레이션 기준 정렬)
+        self.names = names
+        self.lower = [name.lower() for name in self.names]
+        self.chosung = [hangul_chosung(name) for name in self.lower]
+        self.jamo = [hangul_jamo(name) for name in self.lower]
+        self.grams = self._gram_index(self.lower)
+        self.chosung_grams = self._gram_index(self.chosung)
+        self.jamo_grams = self._gram_index(self.jamo)
+
+    @staticmethod
+    def _grams(text):
+        return {text[i:i + 1] for i in range(len(text))} | {text[i:i + 2] for i in range(len(text) - 1)}
+
+    @classmethod
+    def _gram_index(cls, texts):
+        index = {}
+        for i, text in enumerate(texts):
+            for gram in cls._grams(text):
+                index.setdefault(gram, set()).add(i)
+        return index
+
+    @staticmethod
+    def _candidates(index, term):
+        """term 의 1/2글자 gram 을 모두 가진 id 집합"""
+        grams = {term[i:i + 2] for i in range(len(term) - 1)} or {term}
+        postings = sorted((index.get(gram, set()) for gram in grams), key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def match(self, term):
+        """이름 id 집합 — ILIKE '%term%' 결과가 있으면 그대로, 없으면 초성/오타 허용 검색"""
+        term = term.lower().strip()
+        if not term:
+            return set(range(len(self.names)))
+        ids = self._candidates(self.grams, term)
+        if len(term) > 2:
+            ids = {i for i in ids if term in self.lower[i]}
+        if not ids:
+            ids = self.match_fallback(term)
+        return ids
+
+    def match_fallback(self, term):
+        """부분 문자열로 안 걸리는 검색어: 초성 검색, 그래도 없으면 오타 허용 검색"""
+        ids = set()
+        if any(ch in HANGUL_CHOSUNG for ch in term):
+            ids = self.match_chosung(term)
+        if not ids:
+            ids = self.match_fuzzy(term)
+        return ids
+
+    def match_chosung(self, term):
+        """초성이 섞인 검색어 ('ㅅㅎㅁ', '손ㅎㅁ') — 자모 자리는 초성만, 음절 자리는 음절 전체가 같아야 함"""
+        key = hangul_chosung(term)
+        matched = set()
+        for i in self._candidates(self.chosung_grams, key):
+            name, chosung = self.lower[i], self.chosung[i]
+            for start in range(len(name) - len(term) + 1):
+                if all(tc == name[start + j] or (tc in HANGUL_CHOSUNG and tc == chosung[start + j])
+                       for j, tc in enumerate(term)):
+                    matched.add(i)
+                    break
+        return matched
+
+    def match_fuzzy(self, term):
+        """자모 부분 문자열 검색, 없으면 편집 거리 허용 (자모 8자 이하 1회, 그 이상 2회까지)"""
+        jamo = hangul_jamo(term)
+        # 입력 중인 음절(자모 접두)이 맞는 이름이 먼저 ('손흐' → 손흥민)
+        ids = {i for i in self._candidates(self.jamo_grams, jamo) if jamo in self.jamo[i]}
+        if ids or len(jamo) < 4:
+            return ids
+        max_dist = 1 if len(jamo) <= 8 else 2
+        # 조각 필터: 검색어를 max_dist + 1 조각으로 나누면 편집 max_dist 회 뒤에도 한 조각은 그대로 남는다
+        step = len(jamo) // (max_dist + 1)
+        pieces = {jamo[k * step:(k + 1) * step] for k in range(max_dist)} | {jamo[max_dist * step:]}
+        min_len = len(jamo) - max_dist   # 이보다 짧은 이름은 편집 거리가 max_dist 를 넘음
+        candidates = set()
+        for piece in pieces:
+            candidates.update(i for i in self._candidates(self.jamo_grams, piece)
+                              if len(self.jamo[i]) >= min_len and piece in self.jamo[i])
+        if len(candidates) > FUZZY_MAX_CANDIDATES:
+            # 짧은 검색어는 조각이 흔해 후보가 많음 — 검색어 gram 을 많이 가진 이름부터 상한까지만 검사
+            grams = self._grams(jamo)
+            candidates = heapq.nlargest(FUZZY_MAX_CANDIDATES, candidates,
+                                        key=lambda i: (sum(gram in self.jamo[i] for gram in grams), -len(self.jamo[i]), -i))
+        return {i for i in candidates if substring_edit_distance(jamo, self.jamo[i], max_dist) <= max_dist}
+
+
+class PlayerNameIndex(PlayerNameMatcher):
+    """선수 이름 검색 인덱스 (이름별 카드 수, spid 목록 포함)"""
+
+    def __init__(self, rows, version):
+        super().__init__([r['player_name'] for r in rows])
+        self.version = version
+        self.card_counts = [r['card_count'] for r in rows]
+        self.cards = [list(zip(r['overalls'], r['spids'])) for r in rows]
+        self.id_by_name = {name: i for i, name in enumerate(self.names)}
+
+        # /api/player_names 정렬 (card_count DESC, player_name)
+        self.by_count = sorted(range(len(self.names)), key=lambda i: (-self.card_counts[i], i))
+        self.count_rank = [0] * len(self.names)
+        for rank, i in enumerate(self.by_count):
+            self.count_rank[i] = rank
+
+    def search_names(self, term, limit):
+        """[(이름, 카드 수)] — card_count DESC, player_name 순"""
+        ids = self.match(term)
+        if len(ids) > limit * 4:
+            ranked = (i for i in self.by_count if i in ids)
+        else:
+            ranked = iter(sorted(ids, key=self.count_rank.__getitem__))
+        return [(self.names[i], self.card_counts[i]) for _, i in zip(range(limit), ranked)]
+
+    def top_spids(self, term, limit):
+        """이름이 걸리는 카드 중 overall 상위 limit 개 spid"""
+        cards = (card for i in self.match(term) for card in self.cards[i])
+        return [spid for _, spid in heapq.nlargest(limit, cards, key=lambda c: (c[0] is not None, c[0] or 0))]
+
+    def spids(self, term):
+        """이름이 걸리는 모든 카드 spid"""
+        return [spid for i in self.match(term) for _, spid in self.cards[i]]
+
+    def stats(self):
+        return {'names': len(self.names), 'grams': len(self.grams), 'version': self.version}
+
+
+def build_player_name_index(cur, version):
+    """선수 이름 n-gram 인덱스 (numpy 불필요)"""
+    cur.execute(PLAYER_NAME_LOAD_QUERY)
+    return PlayerNameIndex(cur.fetchall(), version)
+
+
+player_names_index = SnapshotLoader(PLAYER_NAME_INDEX == 'memory', build_player_name_index, requires_numpy=False)
+
+# DB 경로(PLAYER_NAME_INDEX=db, 또는 인덱스 적재 전)의 초성/오타 허용 검색용 이름 목록 (카드 데이터 버전별)
+player_name_matchers = LRUCache(max_entries=1, ttl=float(os.getenv('PLAYER_NAME_MATCHER_TTL', 3600)))
+
+
+def player_name_condition(cur, term):
+    """DB 경로의 선수 이름 조건 → (SQL 조건, 파라미터)
+
+    ILIKE '%term%' 에 걸리는 카드가 없으면 인메모리 인덱스와 같은 규칙(초성, 오타 허용)으로 고른 이름으로 찾는다.
+    """
+    term = term.strip()
+    pattern = like_contains(term)
+    cur.execute("SELECT 1 FROM player_cards WHERE player_name ILIKE %s LIMIT 1", (pattern,))
+    if not term or cur.fetchone() is not None:
+        return "player_name ILIKE %s", [pattern]
+    version = current_data_version('cards')
+    matcher = player_name_matchers.get('names', version)
+    if matcher is None:
+        cur.execute("SELECT DISTINCT player_name FROM player_cards WHERE player_name IS NOT NULL ORDER BY player_name")
+        matcher = PlayerNameMatcher([row['player_name'] for row in cur.fetchall()])
+        player_name_matchers.set('names', matcher, version)
+    return "player_name = ANY(%s)", [[matcher.names[i] for i in matcher.match_fallback(term.lower())]]
+
+
+@app.route('/api/search_index_stats')
+@admin_required
+def search_index_stats():
+    """관리자 전용: 현재 워커의 검색 인덱스 상태"""
+    snapshot = card_engine.get_snapshot()
+    bitmap_index = snapshot.bitmap if snapshot is not None else card_bitmaps.get_snapshot()
+    name_index = player_names_index.get_snapshot()
+    return jsonify({
+        'engine': {
+            'enabled': card_engine.enabled,
+            'loaded': snapshot is not None,
+            'load_count': card_engine.load_count,
+            'last_error': card_engine.last_error,
+        },
+        'bitmap': bitmap_index.stats() if bitmap_index is not None else None,
+        'cache': search_cache.stats(),
+        'names': name_index.stats() if name_index is not None else None,
+    })
+
+
+@app.cli.command('check-search-engine')
+def check_search_engine_command():
+    """SQL / SQL+비트맵 / 인메모리 엔진 검색 결과 비교 (개수 + 정렬된 상위 200개)"""
+    if np is None:
+        print("numpy 가 설치되어 있지 않습니다")
+        raise SystemExit(1)
+    engine = CardFilterEngine(True)
+    snap = engine.reload()
+
+    def most_common(field):
+        values = snap.bitmap.bitmaps[field]
+        if not values:
+            return ''
+        return max(values, key=lambda k: int(snap.bitmap.to_mask(snap.bitmap.any_of(field, [k])).sum()))
+
+    nations = sorted(snap.bitmap.bitmaps['nation'])
+    samples = [
+        SearchSpec(),
+        SearchSpec(min_ovr=110),
+        SearchSpec(seasons=tuple(sorted(SEASON_ORDER[:3])), max_ovr=120),
+        SearchSpec(positions=('CF', 'ST'), min_height=185, max_weight=85),
+        SearchSpec(min_salary=20, max_salary=25, preferred_foot='L', weak_foot_min=4),
+        SearchSpec(body_types=tuple(snap.body_types[:2])),
+        SearchSpec(traits=(most_common('trait'),), has_new_trait=True),
+        SearchSpec(clubs=(most_common('club'),), nation=nations[-1] if nations else None),
+        SearchSpec(trait_team_color=most_common('teamcolor')),
+        SearchSpec(player_names=(snap.names[len(snap.names) // 2][:2].lower(),) if snap.names else ()),
+    ]
+
+    failures = 0
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            for spec in samples:
+                results = {
+                    'sql': search_cards_sql(cur, spec, 200),
+                    'bitmap': search_cards_sql(cur, spec, 200, bitmap_index=snap.bitmap),
+                    'memory': engine.search(snap, spec, 200),
+                }
+                # 동점(overall, 이름) 내 순서는 SQL 에서 정해지지 않으므로 키 순서만 비교
+                keys = {
+                    path: (total, [(c['overall'], c['player_name']) for c in cards])
+                    for path, (total, cards) in results.items()
+                }
+                ok = keys['sql'] == keys['bitmap'] == keys['memory']
+                failures += not ok
+                counts = ' '.join(f"{path}={total}" for path, (total, _) in keys.items())
+                print(f"{'OK  ' if ok else 'FAIL'} {spec.cache_key()} {counts}")
+    finally:
+        conn.close()
+    if failures:
+        raise SystemExit(1)
 
 
 @app.route('/')
@@ -360,22 +2093,623 @@ def index():
     # search() 함수 그대로 실행
     return search()
 
-@app.route('/community')
-def community_list():
-    """커뮤니티 메인 - 게시글 목록"""
+# 게시글별 (삭제되지 않은) 댓글 수 — 댓글 작성/삭제와 같은 트랜잭션에서 갱신, 목록은 컬럼만 읽음
+SCHEMA_DDL.append("""
+    ALTER TABLE community.posts ADD COLUMN IF NOT EXISTS comment_count INTEGER NOT NULL DEFAULT 0;
+""")
+
+
+def adjust_comment_count(cur, post_id, delta):
+    """게시글 댓글 수 증감 (호출한 쪽 트랜잭션 안에서)"""
+    cur.execute("UPDATE community.posts SET comment_count = comment_count + %s WHERE id = %s", (delta, post_id))
+
+
+def reconcile_comment_counts(cur):
+    """comment_count 를 실제 댓글 수와 맞춤, 어긋나 있던 게시글 수 반환"""
+    cur.execute("""
+        UPDATE community.posts p
+        SET comment_count = c.actual
+        FROM (
+            SELECT p2.id, COUNT(c2.id) FILTER (WHERE c2.is_deleted = false) AS actual
+            FROM community.posts p2
+            LEFT JOIN community.comments c2 ON c2.post_id = p2.id
+            GROUP BY p2.id
+        ) c
+        WHERE p.id = c.id AND p.comment_count <> c.actual
+    """)
+    return cur.rowcount
+
+
+@app.cli.command('reconcile-comment-counts')
+def reconcile_comment_counts_command():
+    """community.posts.comment_count 재계산 (백필/정합성 점검용)"""
     conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 파라미터
-    category = request.args.get('category', '')
-    page = request.args.get('page', 1, type=int)
-    search_type = request.args.get('search_type', '')
-    keyword = request.args.get('keyword', '')
-    show_popular = request.args.get('popular', '') == 'true'
-    per_page = 20
+    try:
+        with conn.cursor() as cur:
+            fixed = reconcile_comment_counts(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"댓글 수 {fixed}건 보정")
+
+
+# 게시글 요약 컬럼 — 본문 저장/수정 시 트리거가 계산, 목록 조회는 본문 대신 이 컬럼만 읽음
+COMMUNITY_EXCERPT_LENGTH = 100
+
+# 태그/엔티티를 뺀 본문 텍스트 (공백은 하나로)
+_POST_PLAIN_TEXT = ("btrim(regexp_replace(regexp_replace(regexp_replace(COALESCE({content}, ''), "
+                    "'<[^>]*>', ' ', 'g'), '&[a-zA-Z0-9#]+;', ' ', 'g'), '\\s+', ' ', 'g'))")
+
+# 컬럼 → 계산식 ({content} 는 본문 컬럼 참조)
+POST_SUMMARY_COLUMNS = {
+    'has_image': "strpos(COALESCE({content}, ''), '<img') > 0",
+    'has_video': ("(strpos(COALESCE({content}, ''), '<iframe') > 0 OR strpos(COALESCE({content}, ''), 'youtube.com') > 0"
+                  " OR strpos(COALESCE({content}, ''), 'youtu.be') > 0)"),
+    'content_length': f"char_length({_POST_PLAIN_TEXT})",
+    'excerpt': f"left({_POST_PLAIN_TEXT}, {COMMUNITY_EXCERPT_LENGTH})",
+}
+
+# 목록(게시판/게시글 하단)이 읽는 컬럼 — 본문(content)은 넣지 않음
+COMMUNITY_LIST_COLUMNS = ("id, category, title, author, author_ip, user_id, created_at, views, likes, comment_count, "
+                          "is_notice, is_popular, is_deleted, has_image, has_video, content_length, excerpt")
+
+SCHEMA_DDL.append(f"""
+    ALTER TABLE community.posts
+        ADD COLUMN IF NOT EXISTS has_image BOOLEAN NOT NULL DEFAULT false,
+        ADD COLUMN IF NOT EXISTS has_video BOOLEAN NOT NULL DEFAULT false,
+        ADD COLUMN IF NOT EXISTS content_length INTEGER NOT NULL DEFAULT 0,
+        ADD COLUMN IF NOT EXISTS excerpt TEXT NOT NULL DEFAULT '';
+
+    CREATE OR REPLACE FUNCTION community.post_summary_sync() RETURNS trigger AS $$
+    BEGIN
+{"".join(f"        NEW.{column} := {expr.format(content='NEW.content')};{chr(10)}"
+         for column, expr in POST_SUMMARY_COLUMNS.items())}        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS posts_summary_sync ON community.posts;
+    CREATE TRIGGER posts_summary_sync
+        BEFORE INSERT OR UPDATE OF content ON community.posts
+        FOR EACH ROW EXECUTE FUNCTION community.post_summary_sync();
+""")
+
+
+def sync_post_summaries(cur):
+    """요약 컬럼이 본문과 어긋난 게시글 재계산 (최초 백필/복구용), 고친 글 수 반환"""
+    columns = ', '.join(POST_SUMMARY_COLUMNS)
+    exprs = ', '.join(expr.format(content='content') for expr in POST_SUMMARY_COLUMNS.values())
+    cur.execute(f"""
+        UPDATE community.posts
+        SET ({columns}) = ROW({exprs})
+        WHERE ({columns}) IS DISTINCT FROM ({exprs})
+    """)
+    return cur.rowcount
+
+
+@app.cli.command('sync-post-summaries')
+def sync_post_summaries_command():
+    """community.posts 요약 컬럼(has_image/has_video/content_length/excerpt) 재계산"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            fixed = sync_post_summaries(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"게시글 요약 {fixed}건 갱신")
+
+
+VIEW_FLUSH_INTERVAL = float(os.getenv('VIEW_FLUSH_INTERVAL', 5))     # 조회수 버퍼 반영 주기(초)
+VIEW_FLUSH_THRESHOLD = int(os.getenv('VIEW_FLUSH_THRESHOLD', 200))    # 쌓인 조회수가 이만큼이면 즉시 반영
+
+
+class ViewCounter:
+    """게시글 조회수 쓰기 지연 버퍼 (워커별로 모아 주기/임계치마다 한 문장으로 반영, 종료 시 반영)
+
+    반영은 항상 백그라운드 스레드가 풀에서 직접 받은 연결로 함 — 요청 경로는 임계치에 닿으면 깨우기만 함.
+    """
+
+    def __init__(self, interval, threshold):
+        self.interval = interval
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._pending = {}       # post_id → 아직 DB 에 반영하지 않은 조회수
+        self._pending_total = 0
+        self._pid = None
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()   # 임계치 도달 시 반영 스레드를 즉시 깨움
+        # 메트릭
+        self.flushes = 0
+        self.flushed_views = 0
+        self.flush_errors = 0
+
+    def _check_fork(self):
+        """워커 프로세스마다 버퍼와 반영 스레드를 따로 둠"""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._pending = {}
+            self._pending_total = 0
+            self._wake = threading.Event()
+            threading.Thread(target=self._run, name='view-counter', daemon=True).start()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def add(self, post_id):
+        """조회 1회 기록, 이 워커에서 아직 반영되지 않은 조회수 반환 (표시용)"""
+        with self._lock:
+            self._check_fork()
+            pending = self._pending.get(post_id, 0) + 1
+            self._pending[post_id] = pending
+            self._pending_total += 1
+            if self._pending_total >= self.threshold:
+                self._wake.set()
+        return pending
+
+    def pending(self, post_id):
+        """이 워커에서 아직 반영되지 않은 조회수"""
+        return self._pending.get(post_id, 0)
+
+    def flush(self):
+        """쌓인 조회수를 한 번의 UPDATE 로 반영 (실패하면 버퍼로 되돌림)"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                pending, self._pending = self._pending, {}
+                self._pending_total = 0
+            post_ids = sorted(pending)   # 워커 간 행 잠금 순서를 맞춰 교착 방지
+            try:
+                # 요청 스코프 연결(g)의 트랜잭션에 섞이지 않도록 풀에서 직접 체크아웃
+                conn = db_pool.getconn()
+                try:
+                    with conn.cursor() as cur:
+                        cur.execute("""
+                            UPDATE community.posts p
+                            SET views = p.views + d.delta
+                            FROM unnest(%s::bigint[], %s::integer[]) AS d(id, delta)
+                            WHERE p.id = d.id
+                        """, (post_ids, [pending[post_id] for post_id in post_ids]))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    db_pool.putconn(conn)
+            except Exception as e:
+                self.flush_errors += 1
+                print(f"[WARN] 조회수 반영 실패: {e}")
+                with self._lock:
+                    for post_id, delta in pending.items():
+                        self._pending[post_id] = self._pending.get(post_id, 0) + delta
+                        self._pending_total += delta
+                return 0
+            self.flushes += 1
+            self.flushed_views += sum(pending.values())
+            return len(post_ids)
+
+    def stats(self):
+        return {
+            'pending_posts': len(self._pending),
+            'pending_views': self._pending_total,
+            'flushes': self.flushes,
+            'flushed_views': self.flushed_views,
+            'flush_errors': self.flush_errors,
+        }
+
+
+view_counter = ViewCounter(VIEW_FLUSH_INTERVAL, VIEW_FLUSH_THRESHOLD)
+atexit.register(view_counter.flush)
+
+
+@app.route('/api/view_counter_stats')
+@admin_required
+def view_counter_stats():
+    """관리자 전용: 현재 워커의 조회수 버퍼 메트릭"""
+    return jsonify(view_counter.stats())
+
+
+# 커뮤니티 검색 색인: 게시글마다 제목/본문/글쓴이/댓글을 정규화(태그·엔티티·공백 제거, 소문자)한 텍스트와
+# 그 1·2글자 n-gram 배열을 GIN 으로 보관 — 검색은 n-gram 포함(@>)으로 후보를 좁히고 strpos 로 확정
+SCHEMA_DDL.append("""
+    CREATE OR REPLACE FUNCTION community.search_normalize(value TEXT) RETURNS TEXT AS $$
+        SELECT lower(regexp_replace(regexp_replace(regexp_replace(COALESCE(value, ''),
+            '<[^>]*>', '', 'g'), '&[a-zA-Z0-9#]+;', '', 'g'), '\\s+', '', 'g'))
+    $$ LANGUAGE sql IMMUTABLE;
+
+    CREATE OR REPLACE FUNCTION community.search_tokens(value TEXT) RETURNS TEXT[] AS $$
+        SELECT COALESCE(array_agg(DISTINCT token), '{}')
+        FROM (
+            SELECT substr(value, i, 1) AS token FROM generate_series(1, length(value)) i
+            UNION ALL
+            SELECT substr(value, i, 2) FROM generate_series(1, length(value) - 1) i
+        ) t
+    $$ LANGUAGE sql IMMUTABLE;
+
+    CREATE TABLE IF NOT EXISTS community.post_search (
+        post_id BIGINT PRIMARY KEY REFERENCES community.posts(id) ON DELETE CASCADE,
+        title_text TEXT NOT NULL DEFAULT '',
+        content_text TEXT NOT NULL DEFAULT '',
+        author_text TEXT NOT NULL DEFAULT '',
+        comment_text TEXT NOT NULL DEFAULT '',
+        title_tokens TEXT[] NOT NULL DEFAULT '{}',
+        content_tokens TEXT[] NOT NULL DEFAULT '{}',
+        author_tokens TEXT[] NOT NULL DEFAULT '{}',
+        comment_tokens TEXT[] NOT NULL DEFAULT '{}'
+    );
+    CREATE INDEX IF NOT EXISTS post_search_title_idx ON community.post_search USING gin (title_tokens);
+    CREATE INDEX IF NOT EXISTS post_search_content_idx ON community.post_search USING gin (content_tokens);
+    CREATE INDEX IF NOT EXISTS post_search_author_idx ON community.post_search USING gin (author_tokens);
+    CREATE INDEX IF NOT EXISTS post_search_comment_idx ON community.post_search USING gin (comment_tokens);
+""")
+
+# {source} 는 post_id 컬럼 id 를 가진 행 집합
+COMMUNITY_SEARCH_SYNC = """
+    INSERT INTO community.post_search
+        (post_id, title_text, content_text, author_text, comment_text,
+         title_tokens, content_tokens, author_tokens, comment_tokens)
+    SELECT d.id, d.title_text, d.content_text, d.author_text, d.comment_text,
+           community.search_tokens(d.title_text), community.search_tokens(d.content_text),
+           community.search_tokens(d.author_text), community.search_tokens(d.comment_text)
+    FROM (
+        SELECT p.id,
+               community.search_normalize(p.title) AS title_text,
+               community.search_normalize(p.content) AS content_text,
+               community.search_normalize(p.author) AS author_text,
+               COALESCE(c.comment_text, '') AS comment_text
+        FROM community.posts p
+        JOIN {source} ON s.id = p.id
+        LEFT JOIN LATERAL (
+            -- 댓글 사이 줄바꿈: 검색어엔 공백이 없으므로 댓글 경계를 넘는 일치가 생기지 않음
+            SELECT string_agg(community.search_normalize(cm.content), E'\\n' ORDER BY cm.id) AS comment_text
+            FROM community.comments cm
+            WHERE cm.post_id = p.id AND cm.is_deleted = false
+        ) c ON true
+    ) d
+    ON CONFLICT (post_id) DO UPDATE SET
+        title_text = EXCLUDED.title_text,
+        content_text = EXCLUDED.content_text,
+        author_text = EXCLUDED.author_text,
+        comment_text = EXCLUDED.comment_text,
+        title_tokens = EXCLUDED.title_tokens,
+        content_tokens = EXCLUDED.content_tokens,
+        author_tokens = EXCLUDED.author_tokens,
+        comment_tokens = EXCLUDED.comment_tokens
+"""
+SCHEMA_DDL.append(f"""
+    CREATE OR REPLACE FUNCTION community.post_search_sync() RETURNS trigger AS $$
+    DECLARE
+        changed_post BIGINT;
+    BEGIN
+        IF TG_TABLE_NAME = 'posts' THEN
+            changed_post := NEW.id;
+        ELSIF TG_OP = 'DELETE' THEN
+            changed_post := OLD.post_id;
+        ELSE
+            changed_post := NEW.post_id;
+            -- 댓글이 다른 게시글로 옮겨졌으면 원래 게시글도 재색인
+            IF TG_OP = 'UPDATE' THEN
+                IF OLD.post_id <> NEW.post_id THEN
+                    {COMMUNITY_SEARCH_SYNC.format(source="(SELECT OLD.post_id AS id) s")};
+                END IF;
+            END IF;
+        END IF;
+        {COMMUNITY_SEARCH_SYNC.format(source="(SELECT changed_post AS id) s")};
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS posts_search_sync ON community.posts;
+    CREATE TRIGGER posts_search_sync
+        AFTER INSERT OR UPDATE OF title, content, author ON community.posts
+        FOR EACH ROW EXECUTE FUNCTION community.post_search_sync();
+    DROP TRIGGER IF EXISTS comments_search_sync ON community.comments;
+    CREATE TRIGGER comments_search_sync
+        AFTER INSERT OR UPDATE OF content, is_deleted, post_id OR DELETE ON community.comments
+        FOR EACH ROW EXECUTE FUNCTION community.post_search_sync();
+""")
+
+# 검색 종류별 대상 필드와 관련도 가중치 (검색어 등장 횟수 × 가중치의 합으로 정렬)
+COMMUNITY_SEARCH_FIELDS = {
+    'title': ('title',),
+    'content': ('content',),
+    'title_content': ('title', 'content'),
+    'author': ('author',),
+    'comment': ('comment',),
+}
+COMMUNITY_SEARCH_WEIGHTS = {'title': 5, 'author': 3, 'content': 1, 'comment': 1}
+
+
+def sync_community_search(cur):
+    """community.post_search 전체 재색인 (최초 백필/복구용)"""
+    cur.execute("TRUNCATE community.post_search")
+    cur.execute(COMMUNITY_SEARCH_SYNC.format(source="(SELECT id FROM community.posts) s"))
+    return cur.rowcount
+
+
+@app.cli.command('sync-community-search')
+def sync_community_search_command():
+    """커뮤니티 검색 색인 재적재"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            count = sync_community_search(cur)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"게시글 {count}건 검색 색인 완료")
+
+
+def community_search_normalize(value):
+    """community.search_normalize 와 같은 규칙 (태그·엔티티·공백 제거, 소문자)"""
+    value = re.sub(r'<[^>]*>', '', value or '')
+    value = re.sub(r'&[a-zA-Z0-9#]+;', '', value)
+    return re.sub(r'\s+', '', value).lower()
+
+
+def community_search_tokens(term):
+    """검색어 n-gram (한 글자면 그 글자, 아니면 2글자 조각들) — 색인 배열에 모두 있어야 후보"""
+    if len(term) == 1:
+        return [term]
+    return sorted({term[i:i + 2] for i in range(len(term) - 1)})
+
+
+def community_search_sql(search_type, keyword):
+    """검색 조건/관련도 SQL → (condition, params, score_sql, score_params), 검색어가 없으면 None
+
+    공백으로 나눈 검색어가 모두 (대상 필드 중 하나에) 포함돼야 하고, 관련도는 등장 횟수 가중합.
+    조건은 community.post_search s 가 조인돼 있다고 가정.
+    """
+    fields = COMMUNITY_SEARCH_FIELDS.get(search_type)
+    terms = list(dict.fromkeys(filter(None, map(community_search_normalize, keyword.split()))))
+    if not fields or not terms:
+        return None
+
+    conditions, params = [], []
+    scores, score_params = [], []
+    for term in terms:
+        tokens = community_search_tokens(term)
+        matches = []
+        for field in fields:
+            matches.append(f"(s.{field}_tokens @> %s::text[] AND strpos(s.{field}_text, %s) > 0)")
+            params.extend([tokens, term])
+            scores.append(f"(length(s.{field}_text) - length(replace(s.{field}_text, %s, ''))) "
+                          f"/ %s * {COMMUNITY_SEARCH_WEIGHTS[field]}")
+            score_params.extend([term, len(term)])
+        conditions.append(f"({' OR '.join(matches)})")
+    return f"({' AND '.join(conditions)})", params, ' + '.join(scores), score_params
+
+
+# 게시판 목록 keyset 페이지네이션: 공지(작성순) → 일반글(최신순) 두 구간을 (created_at, id) 로 이어 읽음.
+# 목록에 보이는 집합이 바뀌는 쓰기만 'community' 버전을 올리고, 글 수/페이지 시작 키 캐시가 그 버전을 따름
+SCHEMA_DDL.append("""
+    CREATE INDEX IF NOT EXISTS posts_list_idx
+        ON community.posts (is_notice, created_at DESC, id DESC) WHERE is_deleted = false;
+    CREATE INDEX IF NOT EXISTS posts_category_list_idx
+        ON community.posts (category, is_notice, created_at DESC, id DESC) WHERE is_deleted = false;
+    CREATE INDEX IF NOT EXISTS posts_popular_list_idx
+        ON community.posts (is_notice, created_at DESC, id DESC) WHERE is_popular AND is_deleted = false;
+    -- 게시글 상세 하단 목록 (공지 구분 없이 최신순)
+    CREATE INDEX IF NOT EXISTS posts_latest_idx
+        ON community.posts (created_at DESC, id DESC) WHERE is_deleted = false;
+    CREATE INDEX IF NOT EXISTS posts_category_latest_idx
+        ON community.posts (category, created_at DESC, id DESC) WHERE is_deleted = false;
+
+    INSERT INTO data_versions (name) VALUES ('community') ON CONFLICT DO NOTHING;
+    DROP TRIGGER IF EXISTS posts_community_version ON community.posts;
+    CREATE TRIGGER posts_community_version
+        AFTER INSERT OR DELETE OR TRUNCATE ON community.posts
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('community');
+    DROP TRIGGER IF EXISTS posts_community_version_update ON community.posts;
+    CREATE TRIGGER posts_community_version_update
+        AFTER UPDATE ON community.posts
+        FOR EACH ROW
+        WHEN ((OLD.category, OLD.is_notice, OLD.is_popular, OLD.is_deleted, OLD.created_at)
+              IS DISTINCT FROM (NEW.category, NEW.is_notice, NEW.is_popular, NEW.is_deleted, NEW.created_at))
+        EXECUTE FUNCTION bump_data_version('community');
+""")
+
+COMMUNITY_PAGE_SIZE = 20
+
+# 목록 구간: (조건, 정렬 방향) — 공지 먼저(오래된 순), 그다음 일반글(최신순)
+COMMUNITY_NOTICE_FIRST = (('is_notice = true', 'ASC'), ('is_notice = false', 'DESC'))
+COMMUNITY_LATEST_FIRST = (('true', 'DESC'),)
+
+# 필터별 구간 글 수, 페이지 시작 키 (community 버전이 바뀌면 전체 무효화)
+community_page_cache = LRUCache(
+    max_entries=int(os.getenv('COMMUNITY_PAGE_CACHE_SIZE', 5000)),
+    ttl=float(os.getenv('COMMUNITY_PAGE_CACHE_TTL', 600)),
+)
+
+
+def encode_community_cursor(segment, post):
+    """(구간, created_at, id) → 불투명 커서 토큰"""
+    raw = json.dumps([segment, post['created_at'].isoformat(), post['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_community_cursor(token, segments):
+    """커서 토큰 → (구간, created_at, id), 없거나 잘못된 토큰이면 None (page 번호로 대신 찾음)"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        segment, created_at, post_id = json.loads(raw)
+        created_at = datetime.fromisoformat(created_at)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(segment, int) or not 0 <= segment < len(segments) or not isinstance(post_id, int):
+        return None
+    return segment, created_at, post_id
+
+
+def community_segment_counts(cur, where, params, segments, version):
+    """구간별 글 수 (캐시), 전체 글 수는 합계"""
+    key = ('counts', where, tuple(params), segments)
+    counts = community_page_cache.get(key, version)
+    if counts is None:
+        columns = ', '.join(f"COUNT(*) FILTER (WHERE {condition}) AS c{i}"
+                            for i, (condition, _) in enumerate(segments))
+        cur.execute(f"SELECT {columns} FROM community.posts{where}", params)
+        row = cur.fetchone()
+        counts = tuple(row[f'c{i}'] for i in range(len(segments)))
+        community_page_cache.set(key, counts, version)
+    return counts
+
+
+def community_page_anchor(cur, where, params, segments, counts, page, per_page, version):
+    """page 직전 글의 (구간, created_at, id) — 캐시에 없으면 해당 구간 인덱스에서 한 행만 건너뛰어 찾음
+
+    첫 페이지는 None, 마지막 페이지를 넘으면 False
+    """
+    position = (page - 1) * per_page - 1
+    if position < 0:
+        return None
+    if position >= sum(counts):
+        return False
+    key = ('anchor', where, tuple(params), segments, page, per_page)
+    anchor = community_page_cache.get(key, version)
+    if anchor is not None:
+        return anchor
+    for segment, (condition, direction) in enumerate(segments):
+        if position < counts[segment]:
+            clause = f"{where} AND {condition}" if where else f" WHERE {condition}"
+            cur.execute(f"""
+                SELECT created_at, id FROM community.posts{clause}
+                ORDER BY created_at {direction}, id {direction}
+                OFFSET %s LIMIT 1
+            """, params + [position])
+            row = cur.fetchone()
+            if row is None:   # 캐시된 글 수보다 실제 글이 적음
+                return False
+            anchor = (segment, row['created_at'], row['id'])
+            community_page_cache.set(key, anchor, version)
+            return anchor
+        position -= counts[segment]
+    return False
+
+
+def fetch_community_page(cur, columns, where, params, segments, after, limit):
+    """after 다음 글부터 limit 개 → [(구간, 글)] (구간마다 (created_at, id) keyset 조회)"""
+    rows = []
+    start = after[0] if after else 0
+    for segment in range(start, len(segments)):
+        if len(rows) >= limit:
+            break
+        condition, direction = segments[segment]
+        clause = f"{where} AND {condition}" if where else f" WHERE {condition}"
+        segment_params = list(params)
+        if after and segment == after[0]:
+            clause += f" AND (created_at, id) {'>' if direction == 'ASC' else '<'} (%s, %s)"
+            segment_params += [after[1], after[2]]
+        cur.execute(f"""
+            SELECT {columns} FROM community.posts{clause}
+            ORDER BY created_at {direction}, id {direction}
+            LIMIT %s
+        """, segment_params + [limit - len(rows)])
+        rows.extend((segment, post) for post in cur.fetchall())
+    return rows
+
+
+def community_keyset_page(cur, columns, where, params, segments, page, cursor, per_page=COMMUNITY_PAGE_SIZE,
+                          version=None):
+    """keyset 으로 page 번째 목록 조회 → (posts, total_count, next_cursor)
+
+    cursor 는 이전 페이지가 건네준 next_cursor (없거나 잘못됐으면 page 번호로 시작 키를 찾음).
+    version 은 community 데이터 버전 — 글 수/시작 키 캐시가 쓰기 직후부터 맞도록
+    주기 캐시(current_data_version) 대신 매번 DB 에서 읽은 값 (없으면 여기서 읽음).
+    """
+    if version is None:
+        version = get_data_version(cur, 'community')
+    counts = community_segment_counts(cur, where, params, segments, version)
+    after = decode_community_cursor(cursor, segments)
+    from_cursor = after is not None
+    if not from_cursor:
+        after = community_page_anchor(cur, where, params, segments, counts, page, per_page, version)
+    if after is False:
+        return [], sum(counts), None
+
+    rows = fetch_community_page(cur, columns, where, params, segments, after, per_page)
+    next_cursor = None
+    if rows:
+        segment, last = rows[-1]
+        if not from_cursor:
+            # 다음 페이지 시작 키는 캐시에도 남겨 page 번호 링크도 다시 찾지 않게 함.
+            # 클라이언트 커서로 시작한 페이지는 page 번호와 맞는다는 보장이 없으므로 남기지 않음
+            community_page_cache.set(('anchor', where, tuple(params), segments, page + 1, per_page),
+                                     (segment, last['created_at'], last['id']), version)
+        if page * per_page < sum(counts):
+            next_cursor = encode_community_cursor(segment, last)
+    return [post for _, post in rows], sum(counts), next_cursor
+
+
+# 게시판 목록 페이지 캐시: (카테고리, 페이지, 인기글, 관리자) → 가공된 글 목록.
+# 목록에 보이는 컬럼이 바뀌면 트리거가 그 글의 (카테고리/전체) × (전체/인기글) 범위 버전만 올림
+SCHEMA_DDL.append("""
+    CREATE OR REPLACE FUNCTION community.bump_list_versions() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO data_versions (name)
+        SELECT DISTINCT 'community-list:' || scope.category || ':' || scope.popular
+        FROM (
+            SELECT OLD.category, OLD.is_popular WHERE TG_OP <> 'INSERT'
+            UNION ALL
+            SELECT NEW.category, NEW.is_popular WHERE TG_OP <> 'DELETE'
+        ) changed (category, is_popular)
+        CROSS JOIN LATERAL (
+            VALUES ('', '0'), (COALESCE(changed.category, ''), '0'),
+                   ('', CASE WHEN changed.is_popular THEN '1' END),
+                   (COALESCE(changed.category, ''), CASE WHEN changed.is_popular THEN '1' END)
+        ) scope (category, popular)
+        WHERE scope.popular IS NOT NULL
+        ON CONFLICT (name) DO UPDATE SET version = data_versions.version + 1, updated_at = now();
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    DROP TRIGGER IF EXISTS posts_list_versions ON community.posts;
+    CREATE TRIGGER posts_list_versions
+        AFTER INSERT OR DELETE ON community.posts
+        FOR EACH ROW EXECUTE FUNCTION community.bump_list_versions();
+    -- 조회수는 목록 캐시 밖에서 더하므로 제외
+    DROP TRIGGER IF EXISTS posts_list_versions_update ON community.posts;
+    CREATE TRIGGER posts_list_versions_update
+        AFTER UPDATE ON community.posts
+        FOR EACH ROW
+        WHEN ((OLD.category, OLD.title, OLD.author, OLD.author_ip, OLD.created_at, OLD.is_notice, OLD.is_popular,
+               OLD.is_deleted, OLD.likes, OLD.comment_count, OLD.has_image, OLD.has_video, OLD.excerpt)
+              IS DISTINCT FROM (NEW.category, NEW.title, NEW.author, NEW.author_ip, NEW.created_at, NEW.is_notice,
+                                NEW.is_popular, NEW.is_deleted, NEW.likes, NEW.comment_count, NEW.has_image,
+                                NEW.has_video, NEW.excerpt))
+        EXECUTE FUNCTION community.bump_list_versions();
+""")
+
+COMMUNITY_LIST_CACHE_PAGES = int(os.getenv('COMMUNITY_LIST_CACHE_PAGES', 5))   # 앞쪽 몇 페이지까지 캐시할지
+
+# 키마다 (범위 버전, 페이지) 를 보관 — 요청마다 범위 버전 한 행만 읽어 비교
+community_list_cache = LRUCache(
+    max_entries=int(os.getenv('COMMUNITY_LIST_CACHE_SIZE', 500)),
+    ttl=float(os.getenv('COMMUNITY_LIST_CACHE_TTL', 600)),
+)
+
+
+def community_list_version_name(category, popular):
+    """목록 캐시 범위 버전 이름 (트리거의 'community-list:<카테고리>:<인기글>' 과 같은 형식)"""
+    return f"community-list:{category}:{int(popular)}"
+
+
+def load_community_list_page(cur, category, page, show_popular, is_admin, search_type='', keyword='', cursor='',
+                             community_version=None):
+    """게시판 목록 한 페이지 → {'posts', 'total_pages', 'next_cursor'} (글은 KST 변환까지)
+
+    community_version: keyset 글 수/시작 키 캐시에 쓸 community 데이터 버전 (없으면 keyset 쪽에서 읽음)
+    """
+    per_page = COMMUNITY_PAGE_SIZE
     
     # 기본 쿼리
-    query = "SELECT * FROM community.posts"
     params = []
     conditions = []
     
@@ -388,138 +2722,124 @@ def community_list():
     if show_popular:
         conditions.append("is_popular = true")    
     
-    # 검색 조건
-    if keyword and search_type:
-        # 검색어를 공백으로 분리
-        keywords = keyword.split()
-        
-        if search_type == 'title':
-            # 제목 검색
-            search_conditions = []
-            for kw in keywords:
-                # 띄어쓰기 무시: 검색어와 DB 데이터 모두 공백 제거
-                search_conditions.append("REPLACE(title, ' ', '') ILIKE %s")
-                params.append(f'%{kw.replace(" ", "")}%')
-            conditions.append(f"({' AND '.join(search_conditions)})")
-            
-        elif search_type == 'content':
-            # 내용 검색
-            search_conditions = []
-            for kw in keywords:
-                search_conditions.append("REPLACE(content, ' ', '') ILIKE %s")
-                params.append(f'%{kw.replace(" ", "")}%')
-            conditions.append(f"({' AND '.join(search_conditions)})")
-            
-        elif search_type == 'title_content':
-            # 제목+내용 검색
-            search_conditions = []
-            for kw in keywords:
-                search_conditions.append("(REPLACE(title, ' ', '') ILIKE %s OR REPLACE(content, ' ', '') ILIKE %s)")
-                kw_no_space = kw.replace(" ", "")
-                params.extend([f'%{kw_no_space}%', f'%{kw_no_space}%'])
-            conditions.append(f"({' AND '.join(search_conditions)})")
-            
-        elif search_type == 'author':
-            # 글쓴이 검색
-            search_conditions = []
-            for kw in keywords:
-                search_conditions.append("REPLACE(author, ' ', '') ILIKE %s")
-                params.append(f'%{kw.replace(" ", "")}%')
-            conditions.append(f"({' AND '.join(search_conditions)})")
-            
-        elif search_type == 'comment':
-            # 댓글 검색
-            search_conditions = []
-            for kw in keywords:
-                search_conditions.append("""
-                    id IN (
-                        SELECT post_id FROM community.comments 
-                        WHERE REPLACE(content, ' ', '') ILIKE %s
-                    )
-                """)
-                params.append(f'%{kw.replace(" ", "")}%')
-            conditions.append(f"({' AND '.join(search_conditions)})")
+    # 검색 조건 (검색 색인 조인, 띄어쓰기 무시)
+    search = community_search_sql(search_type, keyword) if keyword and search_type else None
+    source = "community.posts"
+    if search:
+        search_condition, search_params, score_sql, score_params = search
+        source += " JOIN community.post_search s ON s.post_id = community.posts.id"
+        conditions.append(search_condition)
+        params.extend(search_params)
     
-    # 관리자 여부 확인
-    is_admin = session.get('user_role') == 'admin'
-
     # 일반 사용자는 삭제되지 않은 글만 보기
     if not is_admin:
         conditions.append("is_deleted = false")
 
     # 조건 적용
-    if conditions:
-        query += " WHERE " + " AND ".join(conditions)
-    
-    # 전체 글 수 계산
-    count_query = f"SELECT COUNT(*) FROM community.posts"
-    if conditions:
-        count_query += " WHERE " + " AND ".join(conditions)
+    where = " WHERE " + " AND ".join(conditions) if conditions else ""
     
-    cur.execute(count_query, params.copy())
-    total_count = cur.fetchone()['count']
+    next_cursor = None
+    if search:
+        # 검색은 관련도순이라 keyset 대신 OFFSET (결과 집합이 검색 색인으로 이미 좁혀짐)
+        cur.execute(f"SELECT COUNT(*) FROM {source}{where}", params.copy())
+        total_count = cur.fetchone()['count']
+        query = f"SELECT {COMMUNITY_LIST_COLUMNS}, {score_sql} AS search_score FROM {source}{where}"
+        query += """
+        ORDER BY search_score DESC, created_at DESC, id DESC
+            LIMIT %s OFFSET %s
+        """
+        cur.execute(query, score_params + params + [per_page, (page - 1) * per_page])
+        posts = cur.fetchall()
+    else:
+        # 공지 → 일반글 keyset 페이지네이션 (글 수/페이지 시작 키는 캐시)
+        posts, total_count, next_cursor = community_keyset_page(
+            cur, COMMUNITY_LIST_COLUMNS, where, params, COMMUNITY_NOTICE_FIRST, page, cursor, per_page,
+            community_version)
     total_pages = (total_count + per_page - 1) // per_page if total_count > 0 else 1
     
-    # 페이징 적용
-    query += """ 
-    ORDER BY 
-            is_notice DESC,
-            CASE WHEN is_notice = true THEN created_at END ASC,
-            CASE WHEN is_notice = false THEN created_at END DESC 
-        LIMIT %s OFFSET %s
-    """
-    params.extend([per_page, (page - 1) * per_page])
-    
-    cur.execute(query, params)
-    posts = cur.fetchall()
-    
-    # UTC를 KST로 변환
+    # UTC를 KST로 변환 (이미지/영상 여부는 저장 시 계산된 요약 컬럼)
     kst = pytz.timezone('Asia/Seoul')
     for post in posts:
         if post['created_at']:
             # UTC로 저장된 시간을 KST로 변환
             utc_time = post['created_at'].replace(tzinfo=pytz.UTC)
             post['created_at'] = utc_time.astimezone(kst)    
+        post['ip_display'] = format_ip_display(post.get('author_ip'))
     
-    # 각 게시글의 댓글 수 조회
-    for post in posts:    
-        cur.execute("""
-            SELECT COUNT(*) as comment_count 
-            FROM community.comments 
-            WHERE post_id = %s AND is_deleted = false
-        """, (post['id'],))
-        comment_result = cur.fetchone()
-        post['comment_count'] = comment_result['comment_count'] if comment_result else 0
+    return {'posts': posts, 'total_pages': total_pages, 'next_cursor': next_cursor}
+
+
+@app.route('/community')
+def community_list():
+    """커뮤니티 메인 - 게시글 목록"""
+    # 파라미터
+    category = request.args.get('category', '')
+    page = max(1, request.args.get('page', 1, type=int))
+    search_type = request.args.get('search_type', '')
+    keyword = request.args.get('keyword', '')
+    show_popular = request.args.get('popular', '') == 'true'
+    
+    # 관리자 여부 확인
+    is_admin = session.get('user_role') == 'admin'
+
+    conn = get_db_connection()
+    cur = conn.cursor()
     
-    # 날짜 포맷 처리 + 이미지/영상 감지
-    from datetime import datetime, date
-    kst_now = datetime.now(kst)
-    today = kst_now.date()
+    # 검색이 아닌 앞쪽 페이지는 캐시 (범위 버전이 그대로면 DB 조회 없이 재사용, 쓴 사람도 바로 반영됨)
+    cache_key = None
+    payload = None
+    if not (keyword and search_type) and page <= COMMUNITY_LIST_CACHE_PAGES:
+        cache_key = (category, page, show_popular, is_admin)
+        version = get_data_version(cur, community_list_version_name(category, show_popular))
+        cached = community_list_cache.get(cache_key)
+        if cached is not None and cached[0] == version:
+            payload = cached[1]
+    if payload is None:
+        # 채울 페이지가 옛 글 수/시작 키로 만들어져 새 범위 버전에 묶이지 않도록 community 버전도 DB 에서 바로 읽음
+        community_version = get_data_version(cur, 'community')
+        # 캐시에 넣을 페이지는 클라이언트 커서 대신 page 번호로만 만듦 (조작되거나 오래된 커서가 공유 항목을 오염시키지 않도록)
+        cursor = '' if cache_key is not None else request.args.get('cursor', '')
+        payload = load_community_list_page(cur, category, page, show_popular, is_admin,
+                                           search_type, keyword, cursor, community_version)
+        if cache_key is not None:
+            community_list_cache.set(cache_key, (version, payload))
     
-    for post in posts:
+    cur.close()
+    conn.close()
+    
+    # 날짜 표시/조회수는 요청마다 (캐시된 글은 복사해서 가공)
+    kst = pytz.timezone('Asia/Seoul')
+    today = datetime.now(kst).date()
+    
+    posts = []
+    for cached_post in payload['posts']:
+        post = dict(cached_post)
         post_date = post['created_at'].date()
         if post_date == today:
             post['display_date'] = post['created_at'].strftime('%H:%M')
         else:
             post['display_date'] = post['created_at'].strftime('%m-%d')
-        
-        post['has_image'] = '<img' in post['content']
-        post['has_video'] = '<iframe' in post['content'] or 'youtube.com' in post['content'] or 'youtu.be' in post['content']
-        post['ip_display'] = format_ip_display(post.get('author_ip'))
-    
-    cur.close()
-    conn.close()
+        post['views'] = (post['views'] or 0) + view_counter.pending(post['id'])
+        posts.append(post)
     
     return render_template('community.html', 
                          posts=posts,
                          current_page=page,
-                         total_pages=total_pages,
+                         total_pages=payload['total_pages'],
+                         next_cursor=payload['next_cursor'],
                          category=category,
                          search_type=search_type,
                          keyword=keyword,
                          show_popular=show_popular)
 
 
+@app.route('/api/community_list_cache_stats')
+@admin_required
+def community_list_cache_stats():
+    """관리자 전용: 게시판 목록 캐시 메트릭"""
+    return jsonify(community_list_cache.stats())
+
+
 @app.route('/community/write', methods=['GET', 'POST'])
 def community_write():
     """글쓰기"""
@@ -582,10 +2902,6 @@ def community_post(post_id):
     conn = get_db_connection()
     cur = conn.cursor()
     
-    # 조회수 증가
-    cur.execute("UPDATE community.posts SET views = views + 1 WHERE id = %s", (post_id,))
-    conn.commit()
-    
     # 게시글 조회
     cur.execute("SELECT * FROM community.posts WHERE id = %s", (post_id,))
     post = cur.fetchone()
@@ -595,6 +2911,9 @@ def community_post(post_id):
         conn.close()
         return "게시글을 찾을 수 없습니다", 404
 
+    # 조회수 증가 (버퍼에 모아 주기적으로 반영, 표시 값에는 미반영분 포함)
+    post['views'] = (post['views'] or 0) + view_counter.add(post_id)
+
     # 삭제된 게시글 접근 제한 (관리자는 제외)
     if post.get('is_deleted') and session.get('user_role') != 'admin':
         cur.close()
@@ -634,41 +2953,17 @@ def community_post(post_id):
     
     # URL에서 카테고리 파라미터 가져오기
     category_filter = request.args.get('category', '')
-    page = request.args.get('page', 1, type=int)
-    per_page = 20
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = COMMUNITY_PAGE_SIZE
     
-    # 카테고리에 따라 게시글 목록 조회
+    # 카테고리에 따라 게시글 목록 조회 (최신순 keyset 페이지네이션)
+    where = " WHERE is_deleted = false"
+    params = []
     if category_filter:
-        # 전체 개수
-        cur.execute("""
-            SELECT COUNT(*) FROM community.posts
-            WHERE category = %s AND is_deleted = false
-        """, (category_filter,))
-        total_count = cur.fetchone()['count']
-        
-        # 특정 카테고리만
-        cur.execute("""
-            SELECT id, category, title, author, author_ip, created_at, views, likes, content
-            FROM community.posts
-            WHERE category = %s AND is_deleted = false
-            ORDER BY created_at DESC
-            LIMIT %s OFFSET %s
-        """, (category_filter, per_page, (page - 1) * per_page))
-    else:
-        # 전체 개수
-        cur.execute("SELECT COUNT(*) FROM community.posts WHERE is_deleted = false")
-        total_count = cur.fetchone()['count']
-        
-        # 전체 게시글
-        cur.execute("""
-            SELECT id, category, title, author, author_ip, created_at, views, likes, content
-            FROM community.posts
-            WHERE is_deleted = false
-            ORDER BY created_at DESC
-            LIMIT %s OFFSET %s
-        """, (per_page, (page - 1) * per_page))
-    
-    related_posts = cur.fetchall()
+        where += " AND category = %s"
+        params.append(category_filter)
+    related_posts, total_count, _ = community_keyset_page(
+        cur, COMMUNITY_LIST_COLUMNS, where, params, COMMUNITY_LATEST_FIRST, page, request.args.get('cursor', ''), per_page)
     total_pages = (total_count + per_page - 1) // per_page if total_count > 0 else 1
     
     # 날짜 포맷 처리
@@ -681,20 +2976,9 @@ def community_post(post_id):
         else:
             p['display_date'] = p['created_at'].strftime('%m-%d')
             
-        # 이미지/영상 감지 추가
-        p['has_image'] = '<img' in p['content']
-        p['has_video'] = '<iframe' in p['content'] or 'youtube.com' in p['content'] or 'youtu.be' in p['content']
         # IP 표시 추가
         p['ip_display'] = format_ip_display(p.get('author_ip'))
-    
-        # 댓글 수 조회 추가
-        cur.execute("""
-            SELECT COUNT(*) as comment_count 
-            FROM community.comments 
-            WHERE post_id = %s AND is_deleted = false
-        """, (p['id'],))
-        comment_result = cur.fetchone()
-        p['comment_count'] = comment_result['comment_count'] if comment_result else 0    
+        p['views'] = (p['views'] or 0) + view_counter.pending(p['id'])
     
     cur.close()
     conn.close()
@@ -748,6 +3032,7 @@ def add_comment(post_id):
             (post_id, author, content, user_id, password_hash, ip_hash, author_ip, parent_comment_id, created_at)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
         """, (post_id, author, content, user_id, password_hash, ip_hash, author_ip, parent_comment_id, datetime.now(pytz.UTC)))
+        adjust_comment_count(cur, post_id, 1)
         
         conn.commit()
         return redirect(url_for('community_post', post_id=post_id))
@@ -901,14 +3186,16 @@ def admin_delete_comment(comment_id):
         if not comment:
             return jsonify({'success': False, 'message': '댓글을 찾을 수 없습니다'}), 404
         
-        # Soft Delete: is_deleted를 true로 설정
+        # Soft Delete: is_deleted를 true로 설정 (이미 삭제된 댓글이면 댓글 수 유지)
         cur.execute("""
             UPDATE community.comments 
             SET is_deleted = true, 
                 deleted_at = CURRENT_TIMESTAMP,
                 deleted_by = %s
-            WHERE id = %s
+            WHERE id = %s AND is_deleted = false
         """, (session.get('user_id'), comment_id))
+        if cur.rowcount:
+            adjust_comment_count(cur, comment['post_id'], -1)
         
         conn.commit()
         return jsonify({
@@ -958,14 +3245,16 @@ def delete_comment(comment_id):
                 conn.close()
                 return jsonify({'success': False, 'message': '비밀번호가 일치하지 않습니다'}), 403
         
-        # Soft Delete: is_deleted를 true로 설정
+        # Soft Delete: is_deleted를 true로 설정 (이미 삭제된 댓글이면 댓글 수 유지)
         cur.execute("""
             UPDATE community.comments 
             SET is_deleted = true, 
                 deleted_at = CURRENT_TIMESTAMP,
                 deleted_by = %s
-            WHERE id = %s
+            WHERE id = %s AND is_deleted = false
         """, (deleted_by, comment_id))
+        if cur.rowcount:
+            adjust_comment_count(cur, comment['post_id'], -1)
         
         conn.commit()
         return jsonify({'success': True, 'message': '댓글이 삭제되었습니다', 'post_id': comment['post_id']})
@@ -1083,212 +3372,791 @@ def edit_post_submit(post_id):
         conn.close()
 
 
-@app.route('/search') 
-def search():
-    """1페이지: 검색 페이지"""
+@app.route('/search') 
+def search():
+    """1페이지: 검색 페이지"""
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        
+        # 시즌 목록 (season_order 순서, 순서에 없는 시즌은 제외)
+        cur.execute("""
+            SELECT s.season_id, s.season_name, s.season_img_url 
+            FROM seasons s
+            JOIN season_order so ON so.season_id = s.season_id
+            ORDER BY so.season_rank
+        """)
+        ordered_seasons = cur.fetchall()
+        
+        cur.execute("SELECT position FROM positions ORDER BY position")
+        positions = [row['position'] for row in cur.fetchall()]
+        
+        cur.execute("""
+            SELECT nation_name 
+            FROM nation_teamcolors 
+            ORDER BY nation_name COLLATE "C"
+        """)
+        nation_data = [row['nation_name'] for row in cur.fetchall()]
+        nations_old = nation_data
+        nation_teamcolors = nation_data
+        
+        cur.execute('SELECT club_name FROM club_teamcolors ORDER BY club_name COLLATE "C"')
+        club_teamcolors = [row['club_name'] for row in cur.fetchall()]
+        
+        cur.execute('SELECT name FROM special_teamcolors ORDER BY name COLLATE "C"')
+        trait_teamcolors = [row['name'] for row in cur.fetchall()]
+        
+        cur.execute("SELECT trait_name FROM player_traits WHERE trait_type = 'new' ORDER BY trait_name")
+        new_traits = [row['trait_name'] for row in cur.fetchall()]
+        
+        cur.execute("SELECT trait_name FROM player_traits WHERE trait_type = 'normal' ORDER BY trait_name")
+        normal_traits = [row['trait_name'] for row in cur.fetchall()]
+        
+        cur.close()
+    finally:
+        conn.close()
+    
+    return render_template('search.html', 
+                         seasons=ordered_seasons,
+                         positions=positions,
+                         nations=nations_old,
+                         nation_teamcolors=nation_teamcolors,
+                         club_teamcolors=club_teamcolors,
+                         trait_teamcolors=trait_teamcolors,
+                         new_traits=new_traits,
+                         normal_traits=normal_traits)
+
+SEARCH_PAGE_SIZE = 200
+SEARCH_STREAM_MAX_ROWS = int(os.getenv('SEARCH_STREAM_MAX_ROWS', 5000))   # 스트리밍 1회 최대 행 수
+
+# 검색 결과 캐시 (정규화된 필터 → 직렬화된 JSON 응답)
+search_cache = LRUCache(
+    max_entries=int(os.getenv('SEARCH_CACHE_SIZE', 2000)),
+    ttl=float(os.getenv('SEARCH_CACHE_TTL', 300)),
+)
+
+
+def canonical_search_key(spec, sort, per_page, cursor, with_facets=False):
+    """SearchSpec + 정렬 + 페이지 정보 → 캐시 키"""
+    return f"{spec.cache_key()}|{sort.cache_key()}|{per_page}|{cursor}|{int(with_facets)}"
+
+
+@app.route('/api/search_results')
+def api_search_results():
+    """검색 결과 API (JSON 반환)
+
+    cursor: 이전 응답의 next_cursor (keyset 페이지네이션, 이후 페이지는 total_count 를 다시 세지 않음)
+    stream=ndjson: 서버 측 커서에서 나오는 대로 한 줄에 카드 하나씩 전송
+    facets=1: 첫 페이지에 시즌/포지션/체형/특성/국가/오버롤 구간별 카드 수(facets) 포함
+    sort: overall(기본) / salary / price(sort_bp 강화 단계) / position(sort_pos 포지션) / season
+    """
+    try:
+        spec = SearchSpec.from_args(request.args)
+        sort = SearchSort.from_args(request.args, spec)
+    except ValueError:
+        return jsonify({'success': False, 'message': '잘못된 검색 조건입니다'}), 400
+    trait_team_color = spec.trait_team_color
+    try:
+        after = decode_search_cursor(request.args.get('cursor', ''), sort)
+    except ValueError:
+        return jsonify({'success': False, 'message': '잘못된 커서입니다'}), 400
+
+    if request.args.get('stream') == 'ndjson':
+        limit = max(1, min(request.args.get('limit', SEARCH_STREAM_MAX_ROWS, type=int), SEARCH_STREAM_MAX_ROWS))
+        return stream_search_results(spec, sort, after, limit)
+
+    per_page = max(1, min(request.args.get('limit', SEARCH_PAGE_SIZE, type=int), SEARCH_PAGE_SIZE))
+    with_facets = request.args.get('facets') == '1' and after is None
+
+    cache_key = canonical_search_key(spec, sort, per_page, request.args.get('cursor', ''), with_facets)
+    if sort.mode == 'price':
+        # 시세 갱신은 가격 정렬 결과만 바꾸므로 캐시 전체가 아니라 키에 시세 버전을 넣음
+        cache_key += f"|prices:{current_data_version('prices')}"
+    version = current_data_version('cards')
+    body = search_cache.get(cache_key, version)
+    if body is not None:
+        return Response(body, mimetype='application/json')
+
+    # 인메모리 엔진이 준비돼 있으면 DB 조회 없이 처리 (엔진은 기본 정렬만, 패싯은 정렬 무관)
+    snapshot = card_engine.get_snapshot()
+    facets = None
+    result = None
+    used_versions = set()   # 응답을 만든 스냅샷들의 데이터 버전
+    if snapshot is not None:
+        used_versions.add(snapshot.version)
+        mask = card_engine.filter_mask(snapshot, spec)
+        if sort.is_default:
+            result = card_engine.search(snapshot, spec, per_page + 1, after, mask=mask)
+        if with_facets:
+            facets = card_engine.facets(snapshot, mask)
+    if result is not None:
+        total_count, cards = result
+        teamcolor_info = snapshot.teamcolor_info.get(trait_team_color) if trait_team_color else None
+    else:
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            bitmap_index = card_bitmaps.get_snapshot()
+            if bitmap_index is not None:
+                used_versions.add(bitmap_index.version)
+            total_count, cards = search_cards_sql(cur, spec, per_page + 1, bitmap_index,
+                                                  after=after, with_count=after is None, sort=sort)
+            if with_facets and facets is None:
+                facets = search_facets_sql(cur, spec, bitmap_index)
+            teamcolor_info = fetch_trait_teamcolor_info(cur, trait_team_color) if trait_team_color else None
+            cur.close()
+        finally:
+            conn.close()
+
+    has_more = len(cards) > per_page
+    cards = cards[:per_page]
+
+    response = {
+        'total_count': total_count,
+        'is_limited': has_more,
+        'next_cursor': encode_search_cursor(cards[-1], sort) if has_more else None,
+        'cards': [dict(c) for c in cards],
+        'teamcolor_info': teamcolor_info
+    }
+    if with_facets:
+        response['facets'] = facets
+    body = app.json.dumps(response)
+    # 백그라운드 재적재 중이라 이전 버전 스냅샷으로 만든 응답은 새 버전으로 캐시하지 않음
+    if used_versions <= {version}:
+        search_cache.set(cache_key, body, version)
+    return Response(body, mimetype='application/json')
+
+
+def stream_search_results(spec, sort, after, limit):
+    """NDJSON 스트리밍: 첫 줄 메타, 카드 한 줄씩, 마지막 줄 요약(next_cursor, total_count)"""
+    trait_team_color = spec.trait_team_color
+    snapshot = card_engine.get_snapshot() if sort.is_default else None
+    result = card_engine.search(snapshot, spec, limit + 1, after) if snapshot is not None else None
+    bitmap_index = card_bitmaps.get_snapshot()
+
+    if result is not None:
+        teamcolor_info = snapshot.teamcolor_info.get(trait_team_color) if trait_team_color else None
+    else:
+        conn = get_db_connection()
+        with conn.cursor() as cur:
+            teamcolor_info = fetch_trait_teamcolor_info(cur, trait_team_color) if trait_team_color else None
+        conn.close()
+
+    def line(obj):
+        return app.json.dumps(obj) + '\n'
+
+    def generate():
+        yield line({'type': 'meta', 'teamcolor_info': teamcolor_info})
+        sent = 0
+        last = None
+        has_more = False
+        total_count = None
+
+        if result is not None:
+            total_count, cards = result
+            for card in cards[:limit]:
+                yield line({'type': 'card', **card})
+                last = card
+                sent += 1
+            has_more = len(cards) > limit
+        else:
+            search_conditions, search_params, page_conditions, page_params = build_search_query(
+                spec, bitmap_index, after, sort)
+            # 스트리밍 동안 요청 스코프 밖에서 쓰므로 풀에서 직접 체크아웃
+            conn = db_pool.getconn()
+            try:
+                with conn.cursor(name='search_stream') as cur:
+                    cur.itersize = SEARCH_PAGE_SIZE
+                    cur.execute(*search_page_query(sort, page_conditions, page_params, limit + 1))
+                    for card in cur:
+                        if sent == limit:
+                            has_more = True
+                            break
+                        yield line({'type': 'card', **card})
+                        last = card
+                        sent += 1
+                if after is None:
+                    with conn.cursor() as cur:
+                        cur.execute(f"SELECT COUNT(*) FROM {SEARCH_FROM} WHERE 1=1" + search_conditions, search_params)
+                        total_count = cur.fetchone()['count']
+            finally:
+                db_pool.putconn(conn)
+
+        yield line({
+            'type': 'end',
+            'count': sent,
+            'total_count': total_count,
+            'next_cursor': encode_search_cursor(last, sort) if has_more and last else None,
+        })
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+# 화면별 카드 프로젝션: 템플릿이 쓰는 필드만 조회 (full_data 전체를 다시 받지 않음)
+_CARD_PRICE_COLUMNS = ", ".join(f"cp.bp{n}" for n in range(1, 14))
+_CARD_PAGE_COLUMNS = """
+    pc.spid, pc.player_name, pc.season_name, pc.overall,
+    pc.full_data->'basic_info' as basic_info,
+    pc.full_data->'game_info' as game_info,
+    pc.full_data->'stats_info' as stats_info,
+    jsonb_strip_nulls(jsonb_build_object(
+        'action_image', pc.full_data->'image_info'->'action_image',
+        'mini_faceon', pc.full_data->'image_info'->'mini_faceon',
+        'mini_faceon_high', pc.full_data->'image_info'->'mini_faceon_high',
+        'nation_img', pc.full_data->'image_info'->'nation_img',
+        'season_img', pc.full_data->'image_info'->'season_img'
+    )) as image_info,
+    EXISTS (SELECT 1 FROM card_price_series s WHERE s.spid = pc.spid) as has_price_history
+"""
+# 현재 시세는 card_latest_prices (추이 차트는 /api/price_history 로 따로 조회)
+_CARD_LATEST_PRICE_COLUMNS = ", ".join(f"lp.bp{n}" for n in range(1, 14))
+_CARD_PAGE_JOINS = """
+    LEFT JOIN card_latest_prices lp ON pc.spid = lp.spid
+"""
+# 캐시 메모리 계산용 크기 (JSON 텍스트 바이트)
+_CARD_PAGE_BYTES = ("octet_length(pc.full_data->>'basic_info') + octet_length(pc.full_data->>'game_info')"
+                    " + octet_length(pc.full_data->>'stats_info') + 200")
+
+
+def latest_prices_payload(row):
+    """card_latest_prices 행 → {'bp1': 가격, ...} (값 없는 강화 단계는 빠짐)"""
+    return {f'bp{n}': row[f'bp{n}'] for n in range(1, 14) if row.get(f'bp{n}') is not None}
+
+
+def hover_card_document(document):
+    """hover 뷰 행 → 캐시 문서 (강화 단계별 최신 시세를 prices 로 묶음)"""
+    document['prices'] = latest_prices_payload(document)
+    for n in range(1, 14):
+        document.pop(f'bp{n}')
+    return document
+
+
+CARD_VIEWS = {
+    # card_detail.html
+    'detail': {
+        'columns': _CARD_PAGE_COLUMNS + ", pc.boost_change, " + _CARD_LATEST_PRICE_COLUMNS,
+        'joins': _CARD_PAGE_JOINS,
+        'bytes': _CARD_PAGE_BYTES,
+    },
+    # compare.html
+    'compare': {
+        'columns': _CARD_PAGE_COLUMNS + ", " + _CARD_LATEST_PRICE_COLUMNS,
+        'joins': _CARD_PAGE_JOINS,
+        'bytes': _CARD_PAGE_BYTES,
+    },
+    # /api/card_hover, /api/card_price, /api/card_hover_batch (최신 시세는 card_latest_prices)
+    'hover': {
+        'columns': """
+            pc.spid,
+            pc.full_data->'basic_info'->'name' as name,
+            pc.full_data->'basic_info'->'height' as height,
+            pc.full_data->'basic_info'->'weight' as weight,
+            pc.full_data->'basic_info'->'body_type' as body_type,
+            pc.full_data->'game_info'->'salary' as salary,
+            pc.full_data->'game_info'->'traits' as traits,
+            pc.full_data->'game_info'->'preferred_foot' as preferred_foot,
+            pc.full_data->'game_info'->'weak_foot' as weak_foot,
+        """ + _CARD_LATEST_PRICE_COLUMNS,
+        'joins': _CARD_PAGE_JOINS,
+        'bytes': "COALESCE(octet_length(pc.full_data->>'game_info'), 0) + 400",
+        'build': hover_card_document,
+    },
+    # player_review.html 상단
+    'review': {
+        'columns': """
+            pc.spid, pc.player_name, pc.season_name,
+            jsonb_strip_nulls(jsonb_build_object('season_img', pc.full_data->'image_info'->'season_img')) as image_info
+        """,
+        'joins': "",
+        'bytes': "200",
+    },
+}
+
+
+def card_view_query(view):
+    """화면별 카드 조회 쿼리 (spid = ANY(%s))"""
+    spec = CARD_VIEWS[view]
+    return f"""
+        SELECT {spec['columns']},
+               {spec['bytes']} as doc_bytes
+        FROM player_cards pc
+        {spec['joins']}
+        WHERE pc.spid = ANY(%s)
+    """
+
+
+# 프로젝션 도입 전 쿼리 (bench-card-views 비교용, 따로 조회하던 시세 추이도 같이 포함)
+LEGACY_CARD_VIEW_QUERIES = {
+    'detail': f"""
+        SELECT pc.*,
+               pc.full_data->'basic_info' as basic_info,
+               pc.full_data->'game_info' as game_info,
+               pc.full_data->'stats_info' as stats_info,
+               pc.full_data->'image_info' as image_info,
+               {_CARD_PRICE_COLUMNS},
+               ph.full_data as price_history
+        FROM player_cards pc
+        LEFT JOIN card_prices cp ON pc.spid = cp.spid
+        LEFT JOIN card_price_history ph ON pc.spid = ph.spid
+        WHERE pc.spid = ANY(%s)
+    """,
+    'hover': """
+        SELECT pc.full_data->'basic_info' as basic_info,
+               pc.full_data->'game_info' as game_info,
+               pc.full_data->'image_info' as image_info
+        FROM player_cards pc
+        WHERE pc.spid = ANY(%s)
+    """,
+    'review': """
+        SELECT pc.*,
+               pc.full_data->'basic_info' as basic_info,
+               pc.full_data->'image_info' as image_info
+        FROM player_cards pc
+        WHERE pc.spid = ANY(%s)
+    """,
+}
+LEGACY_CARD_VIEW_QUERIES['compare'] = LEGACY_CARD_VIEW_QUERIES['detail']
+
+
+@app.cli.command('bench-card-views')
+@click.option('--cards', default=50, help='측정할 카드 수 (overall 상위)')
+@click.option('--runs', default=5, help='반복 횟수')
+def bench_card_views_command(cards, runs):
+    """화면별 프로젝션 vs 기존 pc.* 쿼리: 카드당 전송 바이트와 조회+디코딩 시간 비교"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT spid FROM player_cards ORDER BY overall DESC NULLS LAST LIMIT %s", (cards,))
+            spids = [row['spid'] for row in cur.fetchall()]
+
+            def measure(query):
+                cur.execute(f"SELECT COALESCE(SUM(octet_length(t::text)), 0) AS bytes FROM ({query}) t", (spids,))
+                total_bytes = cur.fetchone()['bytes']
+                started = time.perf_counter()
+                for _ in range(runs):
+                    cur.execute(query, (spids,))
+                    cur.fetchall()
+                elapsed = (time.perf_counter() - started) / runs
+                return total_bytes / max(len(spids), 1), elapsed * 1000 / max(len(spids), 1)
+
+            print(f"카드 {len(spids)}장, {runs}회 평균 (카드당)")
+            for view in CARD_VIEWS:
+                old_bytes, old_ms = measure(LEGACY_CARD_VIEW_QUERIES[view])
+                new_bytes, new_ms = measure(card_view_query(view))
+                print(f"{view:8s} bytes {old_bytes:9.0f} → {new_bytes:9.0f} ({1 - new_bytes / max(old_bytes, 1):6.1%} 감소)"
+                      f"  time {old_ms:7.3f}ms → {new_ms:7.3f}ms")
+    finally:
+        conn.close()
+
+
+# 카드 문서 캐시: 화면별 프로젝션을 (화면, spid) 별로 디코딩해 보관
+card_documents = LRUCache(
+    max_entries=int(os.getenv('CARD_CACHE_SIZE', 5000)),
+    ttl=float(os.getenv('CARD_CACHE_TTL', 3600)),
+    max_bytes=int(os.getenv('CARD_CACHE_MAX_BYTES', 64 * 1024 * 1024)),  # JSON 텍스트 크기 기준
+)
+
+
+def latest_data_versions(*names):
+    """data_versions 를 캐시 없이 바로 읽은 버전 튜플 (ETag 용, 갱신 직후 304 가 나가지 않도록)"""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cur:
+            return tuple(get_data_version(cur, name) for name in names)
+    finally:
+        conn.close()
+
+
+def card_documents_version():
+    """카드 문서가 의존하는 데이터 버전 (카드 데이터, 시세)"""
+    return latest_data_versions('cards', 'prices')
+
+
+def get_card_documents(view, spids, version=None):
+    """spid → 카드 문서 dict (없는 카드는 빠짐). 캐시에 없는 카드만 한 번에 조회"""
+    version = version or card_documents_version()
+    documents = {}
+    missing = []
+    for spid in spids:
+        document = card_documents.get((view, spid), version)
+        if document is None:
+            missing.append(spid)
+        else:
+            documents[spid] = document
+    if missing:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(card_view_query(view), (missing,))
+                rows = cur.fetchall()
+        finally:
+            conn.close()
+        build = CARD_VIEWS[view].get('build')
+        for row in rows:
+            document = dict(row)
+            size = document.pop('doc_bytes')
+            if build:
+                document = build(document)
+            card_documents.set((view, document['spid']), document, version, size=size)
+            documents[document['spid']] = document
+    return documents
+
+
+def card_etag(kind, spids, version):
+    """카드 응답용 강한 ETag (화면 종류 + spid + 데이터 버전)"""
+    raw = json.dumps([kind, list(spids), list(version), os.getenv('ETAG_SALT', '')])
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def etag_response(etag, build):
+    """If-None-Match 가 일치하면 304, 아니면 build() 결과에 ETag 를 붙여 반환 (매번 재검증)"""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = app.make_response(build())
+    if response.status_code in (200, 304):
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'public, no-cache'
+    return response
+
+
+@app.route('/api/card_cache_stats')
+@admin_required
+def card_cache_stats():
+    """관리자 전용: 카드 문서 캐시 통계"""
+    return jsonify(card_documents.stats())
+
+
+PRICE_SERIES_MAX_POINTS = 1000
+
+
+def lttb_indices(xs, ys, threshold):
+    """Largest-Triangle-Three-Buckets 다운샘플링: 모양을 유지하며 남길 점의 인덱스 목록"""
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+    indices = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        # 다음 버킷의 평균점
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, n)
+        if bucket == threshold - 3:
+            next_start, next_end = n - 1, n
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+        # 이전 선택점 a, 평균점과 이루는 삼각형 넓이가 최대인 점 선택
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            area = abs((ax - avg_x) * (ys[i] - ay) - (ax - xs[i]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = i, area
+        indices.append(best)
+        a = best
+    indices.append(n - 1)
+    return indices
+
+
+def get_price_series(spid, boosts, start=None, end=None, points=None):
+    """강화 단계별 시세 추이 [start, end] 구간 (points 가 있으면 LTTB 로 다운샘플링)"""
     conn = get_db_connection()
     try:
         cur = conn.cursor()
-        
-        # 모든 시즌 가져오기
-        cur.execute("""
-            SELECT season_id, season_name, season_img_url 
-            FROM seasons
-        """)
-        all_seasons = cur.fetchall()
-        
-        seasons_dict = {s['season_id']: s for s in all_seasons}
-        
-        ordered_seasons = []
-        for sid in SEASON_ORDER:
-            if sid in seasons_dict:
-                ordered_seasons.append(seasons_dict[sid])
-        
-        cur.execute("SELECT position FROM positions ORDER BY position")
-        positions = [row['position'] for row in cur.fetchall()]
-        
         cur.execute("""
-            SELECT nation_name 
-            FROM nation_teamcolors 
-            ORDER BY nation_name COLLATE "C"
-        """)
-        nation_data = [row['nation_name'] for row in cur.fetchall()]
-        nations_old = nation_data
-        nation_teamcolors = nation_data
-        
-        cur.execute('SELECT club_name FROM club_teamcolors ORDER BY club_name COLLATE "C"')
-        club_teamcolors = [row['club_name'] for row in cur.fetchall()]
-        
-        cur.execute('SELECT name FROM special_teamcolors ORDER BY name COLLATE "C"')
-        trait_teamcolors = [row['name'] for row in cur.fetchall()]
-        
-        cur.execute("SELECT trait_name FROM player_traits WHERE trait_type = 'new' ORDER BY trait_name")
-        new_traits = [row['trait_name'] for row in cur.fetchall()]
-        
-        cur.execute("SELECT trait_name FROM player_traits WHERE trait_type = 'normal' ORDER BY trait_name")
-        normal_traits = [row['trait_name'] for row in cur.fetchall()]
-        
+            SELECT s.boost, array_agg(u.at ORDER BY u.i) AS times, array_agg(u.price ORDER BY u.i) AS prices
+            FROM card_price_series s
+            CROSS JOIN LATERAL unnest(s.times, s.prices) WITH ORDINALITY AS u(at, price, i)
+            WHERE s.spid = %s AND s.boost = ANY(%s)
+              AND (%s::timestamp IS NULL OR u.at >= %s::timestamp)
+              AND (%s::timestamp IS NULL OR u.at <= %s::timestamp)
+            GROUP BY s.boost
+        """, (spid, boosts, start, start, end, end))
+        rows = cur.fetchall()
         cur.close()
     finally:
         conn.close()
-    
-    return render_template('search.html', 
-                         seasons=ordered_seasons,
-                         positions=positions,
-                         nations=nations_old,
-                         nation_teamcolors=nation_teamcolors,
-                         club_teamcolors=club_teamcolors,
-                         trait_teamcolors=trait_teamcolors,
-                         new_traits=new_traits,
-                         normal_traits=normal_traits)
-
-@app.route('/api/search_results')
-def api_search_results():
-    """검색 결과 API (JSON 반환)"""
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        
-        player_name_raw = request.args.get('player_name', '')
-        player_names = [name.strip() for name in player_name_raw.split(',') if name.strip()]
-        selected_seasons = request.args.getlist('seasons')
-        selected_positions = request.args.getlist('positions')
-        min_ovr = request.args.get('min_ovr', '')
-        max_ovr = request.args.get('max_ovr', '')
-        min_salary = request.args.get('min_salary', '')
-        max_salary = request.args.get('max_salary', '')
-        preferred_foot = request.args.get('preferred_foot', '')
-        weak_foot_min = request.args.get('weak_foot_min', '')
-        min_height = request.args.get('min_height', '')
-        max_height = request.args.get('max_height', '')
-        min_weight = request.args.get('min_weight', '')
-        max_weight = request.args.get('max_weight', '')
-        selected_body_types = request.args.getlist('body_types')
-        new_trait = request.args.get('new_trait', '')
-        normal_trait_1 = request.args.get('normal_trait_1', '')
-        normal_trait_2 = request.args.get('normal_trait_2', '')
-        has_new_trait = request.args.get('has_new_trait', '') == 'on'
-        nation_team_color = request.args.get('nation_team_color', '')
-        club_team_color_1 = request.args.get('club_team_color_1', '')
-        club_team_color_2 = request.args.get('club_team_color_2', '')
-        trait_team_color = request.args.get('trait_team_color', '')
-
-        per_page = 200
-
-        selected_traits = []
-        if new_trait: selected_traits.append(new_trait)
-        if normal_trait_1: selected_traits.append(normal_trait_1)
-        if normal_trait_2: selected_traits.append(normal_trait_2)
-
-        search_conditions, search_params = build_search_conditions(
-            player_names, selected_seasons, selected_positions, min_ovr, max_ovr,
-            min_salary, max_salary, preferred_foot, weak_foot_min, min_height, max_height,
-            min_weight, max_weight, selected_body_types, selected_traits, nation_team_color,
-            club_team_color_1, club_team_color_2, trait_team_color, has_new_trait
-        )
 
-        count_query = "SELECT COUNT(*) FROM player_cards WHERE 1=1" + search_conditions
-        cur.execute(count_query, search_params)
-        total_count = cur.fetchone()['count']
-        
-        teamcolor_info = None
-        if trait_team_color:
-            cur.execute(
-                "SELECT name, min_count, stat1_name, stat1_value, stat2_name, stat2_value, "
-                "stat3_name, stat3_value, stat4_name, stat4_value "
-                "FROM teamcolor_effects WHERE name = %s AND type = '특성'",
-                (trait_team_color,)
-            )
-            effect = cur.fetchone()
-            if effect:
-                stats = []
-                for i in range(1, 5):
-                    stat_name = effect[f'stat{i}_name']
-                    stat_value = effect[f'stat{i}_value']
-                    if stat_name and stat_value is not None:
-                        stats.append({'name': stat_name, 'value': stat_value})
-                teamcolor_info = {
-                    'name': effect['name'],
-                    'min_count': effect['min_count'],
-                    'stats': stats
-                }
+    series = {}
+    for row in rows:
+        times, prices = row['times'], row['prices']
+        if points:
+            keep = lttb_indices([t.timestamp() for t in times], prices, points)
+            times = [times[i] for i in keep]
+            prices = [prices[i] for i in keep]
+        series[str(row['boost'])] = {
+            'times': [t.isoformat(timespec='minutes') for t in times],
+            'values': prices,
+            'total': len(row['times']),
+        }
+    return series
 
-        query = """
-        SELECT spid, player_name, season_name, overall, position,
-               COALESCE(full_data->'image_info'->>'mini_faceon', full_data->'image_info'->>'mini_faceon_high') as image,
-               full_data->'image_info'->>'mini_faceon_high' as image_high,
-               full_data->'image_info'->>'season_img' as season_img,
-               full_data->'game_info'->>'salary' as salary,
-               full_data->'basic_info'->>'nation' as nation,
-               full_data->'stats_info'->'main_overall'->'preferred_positions' as preferred_positions,
-               full_data->'game_info'->>'preferred_foot' as preferred_foot,
-               full_data->'game_info'->>'weak_foot' as weak_foot,
-               full_data->'basic_info'->>'height' as height,
-               full_data->'basic_info'->>'weight' as weight,
-               full_data->'basic_info'->>'body_type' as body_type,
-               full_data->'game_info'->>'skill_moves' as skill_moves,
-               full_data->'game_info'->'traits' as traits,
-               boost_change
-        FROM player_cards
-        WHERE 1=1
-        """ + search_conditions + """
-        ORDER BY overall DESC, player_name
-        LIMIT %s OFFSET %s
-        """
 
-        cur.execute(query, search_params + [per_page, 0])
-        cards = cur.fetchall()
-        cur.close()
+@app.route('/api/price_history/<int:spid>')
+def price_history(spid):
+    """시세 추이 구간 조회 (?boost=8&from=2026-01-01&to=...&points=120)"""
+    try:
+        boosts = sorted({int(b) for b in request.args.get('boost', '').split(',') if b.strip()}) or list(range(1, 14))
+        start = datetime.fromisoformat(request.args['from']) if request.args.get('from') else None
+        end = datetime.fromisoformat(request.args['to']) if request.args.get('to') else None
+        points = request.args.get('points', type=int)
+    except ValueError:
+        return jsonify({'success': False, 'message': '잘못된 조회 조건입니다'}), 400
+    if points is not None:
+        points = max(3, min(points, PRICE_SERIES_MAX_POINTS))
+    version = card_documents_version()
+    kind = f"price_history:{boosts}:{start}:{end}:{points}"
+    return etag_response(card_etag(kind, (spid,), version), lambda: jsonify({
+        'success': True,
+        'series': get_price_series(spid, boosts, start, end, points),
+    }))
+
+
+# 시장 분석: 배치 작업이 전체 시세 추이로 지표를 계산해 card_market_stats 에 기록, API 는 조회만
+MARKET_CHANGE_DAYS = (1, 7, 30)
+MARKET_VOLATILITY_DAYS = 30
+MARKET_METRICS = ('change_1d', 'change_7d', 'change_30d', 'volatility_30d', 'from_ath', 'from_atl')
+SCHEMA_DDL.append("""
+    CREATE TABLE IF NOT EXISTS card_market_stats (
+        spid BIGINT NOT NULL,
+        boost SMALLINT NOT NULL,
+        season_id INTEGER NOT NULL,
+        price BIGINT NOT NULL,
+        as_of TIMESTAMP NOT NULL,
+        change_1d DOUBLE PRECISION,
+        change_7d DOUBLE PRECISION,
+        change_30d DOUBLE PRECISION,
+        volatility_30d DOUBLE PRECISION,
+        ath BIGINT NOT NULL,
+        atl BIGINT NOT NULL,
+        from_ath DOUBLE PRECISION,
+        from_atl DOUBLE PRECISION,
+        season_percentile DOUBLE PRECISION,
+        computed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (spid, boost)
+    );
+""" + "".join(
+    f"    CREATE INDEX IF NOT EXISTS card_market_stats_{metric}_idx ON card_market_stats (boost, {metric});\n"
+    for metric in MARKET_METRICS
+) + """
+    INSERT INTO data_versions (name) VALUES ('market') ON CONFLICT DO NOTHING;
+    DROP TRIGGER IF EXISTS card_market_stats_version ON card_market_stats;
+    CREATE TRIGGER card_market_stats_version
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON card_market_stats
+        FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version('market');
+""")
+
+
+def compute_market_stats(spids, boosts, times_list, prices_list):
+    """시세 시계열 목록(epoch 초, 가격) → 지표 배열 dict (numpy 벡터 연산)
+
+    모든 시계열을 이어 붙인 뒤 (시계열 번호, 시각) 복합 키로 한 번에 검색해
+    최근 30일 일별 가격 행렬을 만들고, 변동률/변동성/최고·최저가 대비/시즌 내 백분위를 계산한다.
+    """
+    lengths = np.array([len(t) for t in times_list], dtype=np.int64)
+    keep = np.flatnonzero(lengths > 0)
+    spids = np.asarray(spids, dtype=np.int64)[keep]
+    boosts = np.asarray(boosts, dtype=np.int64)[keep]
+    lengths = lengths[keep]
+    if not len(keep):
+        return None
+    times = np.concatenate([np.asarray(times_list[i], dtype=np.int64) for i in keep])
+    prices = np.concatenate([np.asarray(prices_list[i], dtype=np.float64) for i in keep])
+    count = len(keep)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    last = starts + lengths - 1
+
+    # 일별 가격 행렬 (count × 31): 기준 시각(전체 최신 시각)에서 d일 전 시점의 직전 가격
+    t_min, now = int(times.min()), int(times.max())
+    span = now - t_min + 1
+    series = np.repeat(np.arange(count, dtype=np.int64), lengths)
+    keys = series * span + (times - t_min)
+    days = max(max(MARKET_CHANGE_DAYS), MARKET_VOLATILITY_DAYS)
+    grid = now - np.arange(days, -1, -1, dtype=np.int64) * 86400
+    grid_keys = np.arange(count, dtype=np.int64)[:, None] * span + (grid - t_min)[None, :]
+    pos = np.searchsorted(keys, grid_keys, side='right') - 1
+    valid = pos >= starts[:, None]
+    daily = np.where(valid, prices[np.maximum(pos, 0)], np.nan)
+    daily[daily <= 0] = np.nan
+
+    current = daily[:, -1]
+    result = {
+        'spid': spids,
+        'boost': boosts,
+        'season_id': spids // 1000000,
+        'price': prices[last],
+        'as_of': times[last],
+    }
+    for n in MARKET_CHANGE_DAYS:
+        result[f'change_{n}d'] = current / daily[:, -1 - n] - 1
+
+    # 일별 로그 수익률의 표본 표준편차 (유효 수익률 2개 미만이면 NaN)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        returns = np.diff(np.log(daily), axis=1)[:, -MARKET_VOLATILITY_DAYS:]
+    present = ~np.isnan(returns)
+    n_returns = present.sum(axis=1)
+    mean = np.where(present, returns, 0).sum(axis=1) / np.maximum(n_returns, 1)
+    squares = (np.where(present, returns - mean[:, None], 0) ** 2).sum(axis=1)
+    result[f'volatility_{MARKET_VOLATILITY_DAYS}d'] = np.where(
+        n_returns >= 2, np.sqrt(squares / np.maximum(n_returns - 1, 1)), np.nan)
+
+    ath = np.maximum.reduceat(prices, starts)
+    atl = np.minimum.reduceat(prices, starts)
+    result['ath'], result['atl'] = ath, atl
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result['from_ath'] = np.where(ath > 0, prices[last] / ath - 1, np.nan)
+        result['from_atl'] = np.where(atl > 0, prices[last] / atl - 1, np.nan)
+
+    # (시즌, 강화 단계) 그룹 안에서 현재가 이하인 카드 비율 (동가는 같은 백분위)
+    group = result['season_id'] * 100 + boosts
+    order = np.lexsort((prices[last], group))
+    g, p = group[order], prices[last][order]
+    group_start_flags = np.r_[True, g[1:] != g[:-1]]
+    group_starts = np.flatnonzero(group_start_flags)
+    group_sizes = np.diff(np.r_[group_starts, count])
+    group_of = np.cumsum(group_start_flags) - 1
+    run_ends = np.flatnonzero(np.r_[(g[1:] != g[:-1]) | (p[1:] != p[:-1]), True])
+    run_end = run_ends[np.searchsorted(run_ends, np.arange(count))]
+    percentile = np.empty(count)
+    percentile[order] = (run_end - group_starts[group_of] + 1) / group_sizes[group_of] * 100
+    result['season_percentile'] = percentile
+    return result
+
+
+def load_price_series_matrix(cur):
+    """card_price_series 전체를 (spid, boost, epoch 초 배열, 가격 배열) 목록으로"""
+    cur.execute("""
+        SELECT spid, boost,
+               ARRAY(SELECT CAST(extract(epoch FROM t) AS BIGINT) FROM unnest(times) t) AS times,
+               prices
+        FROM card_price_series
+    """)
+    spids, boosts, times_list, prices_list = [], [], [], []
+    for row in cur:
+        spids.append(row['spid'])
+        boosts.append(row['boost'])
+        times_list.append(row['times'])
+        prices_list.append(row['prices'])
+    return spids, boosts, times_list, prices_list
+
+
+def store_market_stats(cur, stats):
+    """계산 결과로 card_market_stats 교체 (한 트랜잭션, 조회 쪽은 이전 결과를 보다가 커밋 시 전환)"""
+    columns = ['spid', 'boost', 'season_id', 'price', 'as_of'] + [
+        f'change_{n}d' for n in MARKET_CHANGE_DAYS] + [
+        f'volatility_{MARKET_VOLATILITY_DAYS}d', 'ath', 'atl', 'from_ath', 'from_atl', 'season_percentile']
+
+    def value(column, i):
+        v = stats[column][i]
+        if column == 'as_of':
+            return datetime(1970, 1, 1) + timedelta(seconds=int(v))
+        if column in ('spid', 'boost', 'season_id', 'price', 'ath', 'atl'):
+            return int(v)
+        return None if np.isnan(v) else float(v)
+
+    rows = [tuple(value(column, i) for column in columns) for i in range(len(stats['spid']))]
+    cur.execute("DELETE FROM card_market_stats")
+    execute_values(cur, f"INSERT INTO card_market_stats ({', '.join(columns)}) VALUES %s", rows, page_size=1000)
+    return len(rows)
+
+
+@app.cli.command('compute-market-stats')
+def compute_market_stats_command():
+    """전체 카드 시세 지표(변동률, 변동성, 최고/최저가 대비, 시즌 내 백분위) 계산 후 저장"""
+    if np is None:
+        print("numpy 가 설치되어 있지 않습니다")
+        raise SystemExit(1)
+    started = time.perf_counter()
+    conn = get_db_connection()
+    try:
+        with conn.cursor(name='market_series') as cur:
+            cur.itersize = 5000
+            series = load_price_series_matrix(cur)
+        loaded = time.perf_counter()
+        stats = compute_market_stats(*series)
+        computed = time.perf_counter()
+        with conn.cursor() as cur:
+            count = store_market_stats(cur, stats) if stats is not None else 0
+        conn.commit()
     finally:
         conn.close()
+    print(f"시계열 {len(series[0])}개 → 지표 {count}건 저장 "
+          f"(조회 {loaded - started:.1f}s, 계산 {computed - loaded:.1f}s, 저장 {time.perf_counter() - computed:.1f}s)")
+
+
+MARKET_MOVERS_MAX = 100
+
+
+@app.route('/api/market/movers')
+def market_movers():
+    """시세 지표 상위/하위 카드 (?metric=change_7d&direction=up&boost=1&season=&min_price=&limit=20)"""
+    metric = request.args.get('metric', 'change_1d')
+    direction = request.args.get('direction', 'up')
+    if metric not in MARKET_METRICS or direction not in ('up', 'down'):
+        return jsonify({'success': False, 'message': '잘못된 조회 조건입니다'}), 400
+    boost = request.args.get('boost', 1, type=int)
+    season = request.args.get('season', type=int)
+    min_price = request.args.get('min_price', type=int)
+    limit = max(1, min(request.args.get('limit', 20, type=int), MARKET_MOVERS_MAX))
+    version = latest_data_versions('market')
+    kind = f"market_movers:{metric}:{direction}:{boost}:{season}:{min_price}:{limit}"
+
+    def build():
+        conditions = ["ms.boost = %s", f"ms.{metric} IS NOT NULL"]
+        params = [boost]
+        if season is not None:
+            conditions.append("ms.season_id = %s")
+            params.append(season)
+        if min_price is not None:
+            conditions.append("ms.price >= %s")
+            params.append(min_price)
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(f"""
+                SELECT ms.spid, ms.boost, ms.price, ms.as_of, {', '.join(f'ms.{m}' for m in MARKET_METRICS)},
+                       ms.ath, ms.atl, ms.season_percentile, ms.computed_at,
+                       pc.player_name, pc.season_name,
+                       pc.full_data->'image_info'->>'season_img' as season_img
+                FROM card_market_stats ms
+                JOIN player_cards pc ON pc.spid = ms.spid
+                WHERE {' AND '.join(conditions)}
+                ORDER BY ms.{metric} {'DESC' if direction == 'up' else 'ASC'}, ms.spid
+                LIMIT %s
+            """, params + [limit])
+            rows = cur.fetchall()
+            cur.close()
+        finally:
+            conn.close()
+        cards = []
+        for row in rows:
+            card = dict(row)
+            card['as_of'] = card['as_of'].isoformat(timespec='minutes')
+            card['computed_at'] = card['computed_at'].isoformat(timespec='seconds')
+            cards.append(card)
+        return jsonify({'success': True, 'metric': metric, 'direction': direction, 'cards': cards})
+
+    return etag_response(card_etag(kind, (), version), build)
 
-    return jsonify({
-        'total_count': total_count,
-        'is_limited': total_count > per_page,
-        'cards': [dict(c) for c in cards],
-        'teamcolor_info': teamcolor_info
-    })
 
-    
-    
 @app.route('/compare/<int:spid1>/<int:spid2>')
 def compare_cards(spid1, spid2):
     """카드 비교 페이지"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 두 카드의 전체 데이터 조회 (card_detail.html과 동일한 방식)
-    cur.execute("""
-        SELECT pc.*, 
-               pc.full_data->'basic_info' as basic_info,
-               pc.full_data->'game_info' as game_info,
-               pc.full_data->'stats_info' as stats_info,
-               pc.full_data->'image_info' as image_info,
-               cp.bp1, cp.bp2, cp.bp3, cp.bp4, cp.bp5, cp.bp6, cp.bp7,
-               cp.bp8, cp.bp9, cp.bp10, cp.bp11, cp.bp12, cp.bp13
-        FROM player_cards pc
-        LEFT JOIN card_prices cp ON pc.spid = cp.spid
-        WHERE pc.spid IN (%s, %s)
-        ORDER BY pc.spid = %s DESC
-    """, (spid1, spid2, spid1))
-    
-    cards = cur.fetchall()
-
-    if len(cards) != 2:
-        cur.close()
-        conn.close()
-        return "카드를 찾을 수 없습니다", 404
-
-    cur.execute("SELECT full_data FROM card_price_history WHERE spid = %s", (spid1,))
-    ph1_row = cur.fetchone()
-    price_history1 = ph1_row['full_data'] if ph1_row else None
+    version = card_documents_version()
+    return etag_response(card_etag('compare', (spid1, spid2), version),
+                         lambda: render_compare(spid1, spid2, version))
 
-    cur.execute("SELECT full_data FROM card_price_history WHERE spid = %s", (spid2,))
-    ph2_row = cur.fetchone()
-    price_history2 = ph2_row['full_data'] if ph2_row else None
 
-    cur.close()
-    conn.close()
+def render_compare(spid1, spid2, version):
+    """카드 비교 페이지 렌더링 (캐시된 카드 문서 사용)"""
+    documents = get_card_documents('compare', [spid1, spid2], version)
+    if spid1 not in documents or spid2 not in documents:
+        return "카드를 찾을 수 없습니다", 404
+    cards = [documents[spid1], documents[spid2]]
 
     name1 = cards[0]['player_name']
     name2 = cards[1]['player_name']
@@ -1298,69 +4166,210 @@ def compare_cards(spid1, spid2):
     og_description = f"{name1}과 {name2}의 능력치를 비교해보세요!"
 
     return render_template('compare.html', card1=cards[0], card2=cards[1],
-                           price_history1=price_history1, price_history2=price_history2,
                            og_title=og_title, og_description=og_description)
-    
-    
+
+
+# 다중 카드 비교 (/compare?spids=...)
+COMPARE_MAX_CARDS = 6
+# 화면 표시 포지션 → position_overall 키 (좌우 대칭 포지션은 첫 번째 키 값 사용)
+COMPARE_POSITIONS = [
+    ('ST', ('ST',)), ('W', ('LW', 'RW')), ('CF', ('CF',)), ('CAM', ('CAM',)), ('M', ('LM', 'RM')),
+    ('CM', ('CM',)), ('CDM', ('CDM',)), ('WB', ('LWB', 'RWB')), ('B', ('LB', 'RB')), ('CB', ('CB',)),
+    ('SW', ('SW',)), ('GK', ('GK',)),
+]
+COMPARE_SUMMARY_STATS = ['스피드', '슛', '패스', '드리블', '수비', '피지컬']
+
+
+def _compare_number(value):
+    """'185cm', '80kg', '120' 같은 값을 정수로 (없으면 None)"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    digits = ''.join(ch for ch in str(value) if ch.isdigit() or ch == '-')
+    try:
+        return int(digits)
+    except ValueError:
+        return None
+
+
+def compare_metric_row(label, values, lower_is_better=False):
+    """한 지표에 대한 카드별 값/최고값 대비 차이/순위 (None 은 순위에서 제외)"""
+    present = [v for v in values if v is not None]
+    if not present:
+        return None
+    best = min(present) if lower_is_better else max(present)
+    # 동점은 같은 순위 (1, 1, 3 ...)
+    rank_of = {v: sum(1 for p in present if (p < v if lower_is_better else p > v)) + 1 for v in set(present)}
+    return {
+        'label': label,
+        'values': values,
+        'best': best,
+        'deltas': [None if v is None else v - best for v in values],
+        'ranks': [None if v is None else rank_of[v] for v in values],
+        'is_best': [v is not None and v == best for v in values],
+        'spread': max(present) - min(present),
+    }
+
+
+def build_card_comparison(cards):
+    """카드 목록 → 비교 행렬 (요약/세부 스탯, 포지션 오버롤, 급여·신장·체중)
+
+    템플릿은 계산된 값만 출력한다."""
+    stats = [card.get('stats_info') or {} for card in cards]
+    basics = [card.get('basic_info') or {} for card in cards]
+    games = [card.get('game_info') or {} for card in cards]
+
+    def rows(labels, column):
+        matrix = [[_compare_number(column(i, label)) for i in range(len(cards))] for label in labels]
+        return [row for row in (compare_metric_row(label, values) for label, values in zip(labels, matrix)) if row]
+
+    profile = [row for row in (
+        compare_metric_row('오버롤', [_compare_number(card.get('overall')) for card in cards]),
+        compare_metric_row('급여', [_compare_number(g.get('salary')) for g in games], lower_is_better=True),
+        compare_metric_row('신장', [_compare_number(b.get('height')) for b in basics]),
+        compare_metric_row('체중', [_compare_number(b.get('weight')) for b in basics]),
+        compare_metric_row('약발', [_compare_number(g.get('weak_foot')) for g in games]),
+    ) if row]
+
+    position_rows = []
+    for display, keys in COMPARE_POSITIONS:
+        row = compare_metric_row(display, [_compare_number((s.get('position_overall') or {}).get(keys[0])) for s in stats])
+        if row:
+            row['preferred'] = [
+                any(p.get('position') in keys for p in (s.get('main_overall') or {}).get('preferred_positions') or [])
+                for s in stats
+            ]
+            position_rows.append(row)
+
+    # 강화 단계별 최신 시세 (card_latest_prices)
+    prices = []
+    for n in range(1, 14):
+        values = [_compare_number(card.get(f'bp{n}')) for card in cards]
+        values = [v if v and v > 0 else None for v in values]
+        if any(values):
+            prices.append({'label': n, 'values': values})
+
+    return {
+        'profile': profile,
+        'positions': position_rows,
+        'summary': rows(COMPARE_SUMMARY_STATS, lambda i, name: (stats[i].get('summary_stats') or {}).get(name)),
+        'detailed': rows(STAT_NAMES, lambda i, name: (stats[i].get('detailed_stats') or {}).get(name)),
+        'prices': prices,
+    }
+
+
+def parse_compare_spids(raw):
+    """'1,2,3' → 중복 제거된 spid 목록 (순서 유지). 형식 오류면 ValueError"""
+    spids = []
+    for part in (raw or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        spid = int(part)
+        if spid not in spids:
+            spids.append(spid)
+    if not 2 <= len(spids) <= COMPARE_MAX_CARDS:
+        raise ValueError(f"비교할 카드는 2~{COMPARE_MAX_CARDS}장이어야 합니다")
+    return spids
+
+
+def load_card_comparison(spids, version):
+    """비교용 카드 문서(최신 시세 포함, 캐시 미스만 한 번에 조회) + 비교 행렬. 없는 카드가 있으면 None"""
+    documents = get_card_documents('compare', spids, version)
+    if any(spid not in documents for spid in spids):
+        return None, None
+    cards = [documents[spid] for spid in spids]
+    return cards, build_card_comparison(cards)
+
+
+@app.route('/compare')
+def compare_cards_multi():
+    """다중 카드 비교 페이지 (?spids=1,2,3, 최대 6장)"""
+    try:
+        spids = parse_compare_spids(request.args.get('spids'))
+    except ValueError:
+        return "비교할 카드 목록이 올바르지 않습니다", 400
+    version = card_documents_version()
+    return etag_response(card_etag('compare_multi', spids, version),
+                         lambda: render_compare_multi(spids, version))
+
+
+def render_compare_multi(spids, version):
+    """다중 카드 비교 페이지 렌더링"""
+    cards, comparison = load_card_comparison(spids, version)
+    if cards is None:
+        return "카드를 찾을 수 없습니다", 404
+    og_title = "FCOnQ : " + " VS ".join(f"{card['season_name']} - {card['player_name']}" for card in cards)
+    og_description = f"{', '.join(card['player_name'] for card in cards)}의 능력치를 한눈에 비교해보세요!"
+    return render_template('compare_multi.html', cards=cards, comparison=comparison,
+                           og_title=og_title, og_description=og_description)
+
+
+@app.route('/api/compare')
+def api_compare_cards():
+    """다중 카드 비교 행렬 JSON"""
+    try:
+        spids = parse_compare_spids(request.args.get('spids'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    version = card_documents_version()
+
+    def build():
+        cards, comparison = load_card_comparison(spids, version)
+        if cards is None:
+            return jsonify({'success': False, 'message': '카드를 찾을 수 없습니다'}), 404
+        return jsonify({
+            'success': True,
+            'cards': [{
+                'spid': card['spid'],
+                'player_name': card['player_name'],
+                'season_name': card['season_name'],
+                'image_info': card['image_info'],
+            } for card in cards],
+            'comparison': comparison,
+        })
+
+    return etag_response(card_etag('compare_api', spids, version), build)
+
+
 @app.route('/card/<int:spid>')
 def card_detail(spid):
     """3페이지: 카드 상세 정보"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # card_prices 테이블 JOIN 추가
-        cur.execute("""
-            SELECT pc.*, 
-                   pc.full_data->'basic_info' as basic_info,
-                   pc.full_data->'game_info' as game_info,
-                   pc.full_data->'stats_info' as stats_info,
-                   pc.full_data->'image_info' as image_info,
-                   cp.bp1, cp.bp2, cp.bp3, cp.bp4, cp.bp5, cp.bp6, cp.bp7,
-                   cp.bp8, cp.bp9, cp.bp10, cp.bp11, cp.bp12, cp.bp13
-            FROM player_cards pc
-            LEFT JOIN card_prices cp ON pc.spid = cp.spid
-            WHERE pc.spid = %s
-        """, (spid,))
-        
-        card = cur.fetchone()
+    version = card_documents_version()
+    return etag_response(card_etag('card', (spid,), version), lambda: render_card_detail(spid, version))
 
-        POSITION_ORDER = ['ST', 'W', 'CF', 'CAM', 'M', 'CM', 'CDM', 'WB', 'B', 'CB', 'SW', 'GK']
 
-        # 요약 스탯 순서 추가
-        if card and card['stats_info']['main_overall']['card_position'] == 'GK':
-            SUMMARY_ORDER = ['다이빙', '핸들링', '킥', '반응속도', '스피드', '위치선정']
-            # 골키퍼용 세부 스탯 순서
-            DETAILED_ORDER = [
-                'GK 다이빙', 'GK 핸들링', 'GK 킥', 'GK 반응속도', 'GK 위치 선정',
-                '속력', '가속력', '골 결정력', '슛 파워', '중거리 슛', '위치 선정', '발리슛',
-                '페널티 킥', '짧은 패스', '시야', '크로스', '긴 패스', '프리킥', '커브',
-                '드리블', '볼 컨트롤', '민첩성', '밸런스', '반응 속도', '대인 수비', '태클',
-                '가로채기', '헤더', '슬라이딩 태클', '몸싸움', '스태미너', '적극성', '점프', '침착성'
-            ]
-        else:
-            SUMMARY_ORDER = ['스피드', '슛', '패스', '드리블', '수비', '피지컬']
-            # 필드 플레이어용 세부 스탯 순서
-            DETAILED_ORDER = [
-                '속력', '가속력', '골 결정력', '슛 파워', '중거리 슛', '위치 선정', '발리슛',
-                '페널티 킥', '짧은 패스', '시야', '크로스', '긴 패스', '프리킥', '커브',
-                '드리블', '볼 컨트롤', '민첩성', '밸런스', '반응 속도', '대인 수비', '태클',
-                '가로채기', '헤더', '슬라이딩 태클', '몸싸움', '스태미너', '적극성', '점프',
-                '침착성', 'GK 다이빙', 'GK 핸들링', 'GK 킥', 'GK 반응속도', 'GK 위치 선정'
-            ]
-        
-        # 가격 추세 데이터 조회
-        cur.execute("""
-            SELECT full_data FROM card_price_history WHERE spid = %s
-        """, (spid,))
-        price_history = cur.fetchone()
-        price_history_data = price_history['full_data'] if price_history else None
-    finally:
-        cur.close()
-        conn.close()
-    
+def render_card_detail(spid, version):
+    """카드 상세 페이지 렌더링 (캐시된 카드 문서 사용)"""
+    card = get_card_documents('detail', [spid], version).get(spid)
     if not card:
         return "카드를 찾을 수 없습니다", 404
-    
+
+    POSITION_ORDER = ['ST', 'W', 'CF', 'CAM', 'M', 'CM', 'CDM', 'WB', 'B', 'CB', 'SW', 'GK']
+
+    # 요약 스탯 순서 추가
+    if card and card['stats_info']['main_overall']['card_position'] == 'GK':
+        SUMMARY_ORDER = ['다이빙', '핸들링', '킥', '반응속도', '스피드', '위치선정']
+        # 골키퍼용 세부 스탯 순서
+        DETAILED_ORDER = [
+            'GK 다이빙', 'GK 핸들링', 'GK 킥', 'GK 반응속도', 'GK 위치 선정',
+            '속력', '가속력', '골 결정력', '슛 파워', '중거리 슛', '위치 선정', '발리슛',
+            '페널티 킥', '짧은 패스', '시야', '크로스', '긴 패스', '프리킥', '커브',
+            '드리블', '볼 컨트롤', '민첩성', '밸런스', '반응 속도', '대인 수비', '태클',
+            '가로채기', '헤더', '슬라이딩 태클', '몸싸움', '스태미너', '적극성', '점프', '침착성'
+        ]
+    else:
+        SUMMARY_ORDER = ['스피드', '슛', '패스', '드리블', '수비', '피지컬']
+        # 필드 플레이어용 세부 스탯 순서
+        DETAILED_ORDER = [
+            '속력', '가속력', '골 결정력', '슛 파워', '중거리 슛', '위치 선정', '발리슛',
+            '페널티 킥', '짧은 패스', '시야', '크로스', '긴 패스', '프리킥', '커브',
+            '드리블', '볼 컨트롤', '민첩성', '밸런스', '반응 속도', '대인 수비', '태클',
+            '가로채기', '헤더', '슬라이딩 태클', '몸싸움', '스태미너', '적극성', '점프',
+            '침착성', 'GK 다이빙', 'GK 핸들링', 'GK 킥', 'GK 반응속도', 'GK 위치 선정'
+        ]
+
     player_name = card['player_name'] if card else '선수'
     season_name = card['season_name'] if card else ''
     position = card['stats_info']['main_overall']['card_position'] if card else ''
@@ -1371,7 +4380,6 @@ def card_detail(spid):
                                                position_order=POSITION_ORDER,
                                                summary_order=SUMMARY_ORDER,
                                                detailed_order=DETAILED_ORDER,
-                                               price_history=price_history_data,
                                                og_title=og_title,
                                                og_description=og_description)
 
@@ -1500,25 +4508,15 @@ def vote_post(post_id, vote_type):
 @app.route('/player_review/<int:spid>')
 def player_review(spid):
     """선수 후기 페이지"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    # 선수 카드 정보 조회
-    cur.execute("""
-        SELECT pc.*, 
-               pc.full_data->'basic_info' as basic_info,
-               pc.full_data->'image_info' as image_info
-        FROM player_cards pc
-        WHERE pc.spid = %s
-    """, (spid,))
-    
-    card = cur.fetchone()
+    # 선수 카드 정보 조회 (상단 헤더용 프로젝션)
+    card = get_card_documents('review', [spid]).get(spid)
     
     if not card:
-        cur.close()
-        conn.close()
         return "선수 카드를 찾을 수 없습니다", 404
     
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
     # 관리자 여부 확인
     is_admin = session.get('user_role') == 'admin'
 
@@ -1875,17 +4873,22 @@ def get_player_names():
     """선수 이름 리스트 반환 (자동완성용, 시즌 개수 포함)"""
     term = request.args.get('q', '')  # 검색어 파라미터
     
+    name_index = player_names_index.get_snapshot()
+    if name_index is not None:
+        return jsonify([{"name": name, "count": count} for name, count in name_index.search_names(term, 1000)])
+    
     conn = get_db_connection()
     cur = conn.cursor()
     
-    cur.execute("""
+    condition, params = player_name_condition(cur, term)
+    cur.execute(f"""
         SELECT player_name, COUNT(*) AS card_count
         FROM player_cards
-        WHERE player_name ILIKE %s
+        WHERE {condition}
         GROUP BY player_name
         ORDER BY card_count DESC, player_name
         LIMIT 1000
-    """, (f"%{term}%",))
+    """, params)
     
     players = [{"name": row['player_name'], "count": row['card_count']} for row in cur.fetchall()]
     
@@ -2016,11 +5019,12 @@ def get_trait_teamcolor_detail(cur, tc_name):
     cur.execute("""
         SELECT pc.spid, pc.player_name
         FROM player_cards pc
-        WHERE RIGHT(pc.spid::text, 6) IN (
+        JOIN card_attributes ca ON ca.spid = pc.spid
+        WHERE ca.pid IN (
             SELECT player_id FROM special_teamcolor_players WHERE teamcolor_id = %s
         )
-        ORDER BY pc.player_name, array_position(%s::integer[], CAST(LEFT(pc.spid::text, 3) AS INTEGER))
-    """, (teamcolor_id, SEASON_ORDER))
+        ORDER BY pc.player_name, ca.season_rank NULLS LAST
+    """, (teamcolor_id,))
     cards = cur.fetchall()
 
     players = {}
@@ -2146,34 +5150,81 @@ def teamcolor_search():
 @app.route('/api/card_hover/<int:spid>')
 @app.route('/api/card_hover/<int:spid>')
 def card_hover(spid):
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT 
-                pc.full_data->'basic_info' as basic_info,
-                pc.full_data->'game_info' as game_info,
-                pc.full_data->'image_info' as image_info
-            FROM player_cards pc
-            WHERE pc.spid = %s
-        """, (spid,))
-        card = cur.fetchone()
-        cur.close()
-    finally:
-        conn.close()
+    version = card_documents_version()
+    return etag_response(card_etag('hover', (spid,), version), lambda: render_card_hover(spid, version))
 
+
+def render_card_hover(spid, version):
+    """카드 호버 정보 (캐시된 카드 문서 사용)"""
+    card = get_card_documents('hover', [spid], version).get(spid)
     if not card:
         return jsonify({}), 404
-    return jsonify({
-        'name': card['basic_info']['name'],
-        'height': str(card['basic_info'].get('height', '')).replace('cm', '').strip(),
-        'weight': str(card['basic_info'].get('weight', '')).replace('kg', '').strip(),
-        'body_type': card['basic_info'].get('body_type', ''),
-        'salary': card['game_info'].get('salary', ''),
-        'traits': card['game_info'].get('traits', []),
-        'preferred_foot': card['game_info'].get('preferred_foot', ''),
-        'weak_foot': card['game_info'].get('weak_foot', ''),
-    })
+    return jsonify(card_hover_payload(card))
+
+
+def card_hover_payload(card):
+    """hover 문서 → 툴팁 응답 형식"""
+    def value(key, default=''):
+        return default if card[key] is None else card[key]
+
+    return {
+        'name': card['name'],
+        'height': str(value('height')).replace('cm', '').strip(),
+        'weight': str(value('weight')).replace('kg', '').strip(),
+        'body_type': value('body_type'),
+        'salary': value('salary'),
+        'traits': value('traits', []),
+        'preferred_foot': value('preferred_foot'),
+        'weak_foot': value('weak_foot'),
+    }
+
+
+CARD_BATCH_MAX = int(os.getenv('CARD_BATCH_MAX', 200))
+
+
+@app.route('/api/card_hover_batch')
+def card_hover_batch():
+    """여러 카드의 호버 정보 + 최신 시세를 한 번에 (?spids=1,2,3, 캐시 미스만 한 쿼리로 조회)"""
+    try:
+        spids = list(dict.fromkeys(int(part) for part in request.args.get('spids', '').split(',') if part.strip()))
+    except ValueError:
+        return jsonify({'success': False, 'message': '잘못된 카드 목록입니다'}), 400
+    if not spids or len(spids) > CARD_BATCH_MAX:
+        return jsonify({'success': False, 'message': f'카드는 1~{CARD_BATCH_MAX}장까지 조회할 수 있습니다'}), 400
+    version = card_documents_version()
+
+    def build():
+        documents = get_card_documents('hover', spids, version)
+        return jsonify({
+            'success': True,
+            'cards': {
+                str(spid): dict(card_hover_payload(documents[spid]), prices=documents[spid]['prices'])
+                for spid in spids if spid in documents
+            },
+        })
+
+    return etag_response(card_etag('hover_batch', spids, version), build)
+
+
+def _miniface_response(cur, conn, results):
+    """미페 검색 결과 포맷팅"""
+    cur.close()
+    conn.close()
+    
+    if not results:
+        return jsonify({'success': False, 'message': '검색 결과가 없습니다'})
+    
+    # 결과 포맷팅 (딕셔너리 접근)
+    cards = []
+    for row in results:
+        cards.append({
+            'spid': row['spid'],
+            'player_name': row['player_name'],
+            'season_name': row['season_name'],
+            'season_img_url': row['season_img_url'] if row['season_img_url'] else ''
+        })
+    
+    return jsonify({'success': True, 'cards': cards})
 
 
 @app.route('/api/search_miniface', methods=['POST'])
@@ -2189,14 +5240,39 @@ def search_miniface():
         conn = get_db_connection()
         cur = conn.cursor()
         
+        name_index = player_names_index.get_snapshot()
+        if name_index is not None:
+            # 이름 인덱스로 spid 를 먼저 좁히고, 정렬은 인덱스의 이름 순위 + 시즌 순서로
+            spids = name_index.spids(player_name)
+            cur.execute("""
+                SELECT 
+                    pc.spid,
+                    pc.player_name,
+                    pc.season_name,
+                    s.season_img_url,
+                    ca.season_id,
+                    ca.season_rank
+                FROM public.player_cards pc
+                JOIN public.card_attributes ca ON ca.spid = pc.spid
+                LEFT JOIN public.seasons s ON s.season_id = ca.season_id
+                WHERE pc.spid = ANY(%s)
+            """, (spids,))
+            results = sorted(cur.fetchall(), key=lambda row: (
+                name_index.count_rank[name_index.id_by_name[row['player_name']]],
+                row['season_rank'] is None,
+                row['season_rank'] or 0,
+            ))
+            return _miniface_response(cur, conn, results)
+        
         # 선수 검색 (시즌 정보와 JOIN)
-        query = """
+        condition, params = player_name_condition(cur, player_name)
+        query = f"""
             WITH player_counts AS (
                 SELECT 
                     player_name,
                     COUNT(*) as card_count
                 FROM public.player_cards
-                WHERE player_name ILIKE %s
+                WHERE {condition}
                 GROUP BY player_name
             )
             SELECT 
@@ -2204,39 +5280,22 @@ def search_miniface():
                 pc.player_name,
                 pc.season_name,
                 s.season_img_url,
-                CAST(LEFT(pc.spid::text, 3) AS INTEGER) as season_id
+                ca.season_id
             FROM public.player_cards pc
-            LEFT JOIN public.seasons s 
-                ON CAST(LEFT(pc.spid::text, 3) AS INTEGER) = s.season_id
+            JOIN public.card_attributes ca ON ca.spid = pc.spid
+            LEFT JOIN public.seasons s ON s.season_id = ca.season_id
             INNER JOIN player_counts pco
                 ON pc.player_name = pco.player_name
-            WHERE pc.player_name ILIKE %s
             ORDER BY 
                 pco.card_count DESC, 
                 pc.player_name,
-                array_position(%s::integer[], CAST(LEFT(pc.spid::text, 3) AS INTEGER))
+                ca.season_rank NULLS LAST
         """
 
-        cur.execute(query, (f'%{player_name}%', f'%{player_name}%', SEASON_ORDER))        
+        cur.execute(query, params)
         results = cur.fetchall()
         
-        cur.close()
-        conn.close()
-        
-        if not results:
-            return jsonify({'success': False, 'message': '검색 결과가 없습니다'})
-        
-        # 결과 포맷팅 (딕셔너리 접근)
-        cards = []
-        for row in results:
-            cards.append({
-                'spid': row['spid'],
-                'player_name': row['player_name'],
-                'season_name': row['season_name'],
-                'season_img_url': row['season_img_url'] if row['season_img_url'] else ''
-            })
-        
-        return jsonify({'success': True, 'cards': cards})
+        return _miniface_response(cur, conn, results)
         
     except Exception as e:
         import traceback
@@ -2627,7 +5686,15 @@ def squad_search():
     try:
         cur = conn.cursor()
         
-        query = """
+        name_index = player_names_index.get_snapshot()
+        if name_index is not None:
+            # 이름 인덱스에서 overall 상위 100장을 골라 해당 spid 만 조회
+            condition = "spid = ANY(%s)"
+            params = (name_index.top_spids(term, 100),)
+        else:
+            condition, params = player_name_condition(cur, term)
+        
+        query = f"""
             SELECT spid, player_name, season_name, overall, position,
                    COALESCE(full_data->'image_info'->>'mini_faceon', full_data->'image_info'->>'mini_faceon_high') as image,
                    full_data->'image_info'->>'season_img' as season_img,
@@ -2636,11 +5703,11 @@ def squad_search():
                    full_data->'stats_info'->'position_overall' as position_overall,
                    full_data->'game_info'->'traits' as traits
             FROM player_cards
-            WHERE player_name ILIKE %s
+            WHERE {condition}
             ORDER BY overall DESC
             LIMIT 100
         """
-        cur.execute(query, (f"%{term}%",))
+        cur.execute(query, params)
         cards = [dict(row) for row in cur.fetchall()]
         
         cur.close()
@@ -2910,41 +5977,46 @@ def squad_trait_teamcolor():
 
 @app.route('/api/card_price/<int:spid>')
 def card_price(spid):
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
+    """카드 최신 시세 (hover 문서 캐시 공유)"""
+    version = card_documents_version()
 
-        cur.execute("""
-            SELECT full_data
-            FROM card_price_history
-            WHERE spid = %s
-        """, (spid,))
-        row = cur.fetchone()
+    def build():
+        card = get_card_documents('hover', [spid], version).get(spid)
+        return jsonify(card['prices'] if card else {})
 
-        if row and row['full_data']:
-            result = {}
-            for boost_str, data in row['full_data'].items():
-                values = data.get('values', []) if isinstance(data, dict) else data
-                if values:
-                    result[f'bp{boost_str}'] = values[-1]
-            if result:
-                cur.close()
-                return jsonify(result)
+    return etag_response(card_etag('price', (spid,), version), build)
 
-        cur.execute("""
-            SELECT bp1, bp2, bp3, bp4, bp5, bp6, bp7,
-                   bp8, bp9, bp10, bp11, bp12, bp13
-            FROM card_prices
-            WHERE spid = %s
-        """, (spid,))
-        row = cur.fetchone()
+
+@app.route('/api/card_prices_batch', methods=['POST'])
+def card_prices_batch():
+    """여러 카드의 최신 시세를 한 번에 (스쿼드 메이커용, card_latest_prices 조회)"""
+    try:
+        spids = list(dict.fromkeys(int(spid) for spid in (request.json or {}).get('spids', [])))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': '잘못된 카드 목록입니다'}), 400
+    if len(spids) > CARD_BATCH_MAX:
+        return jsonify({'success': False, 'message': f'카드는 최대 {CARD_BATCH_MAX}장까지 조회할 수 있습니다'}), 400
+    if not spids:
+        return jsonify({'success': True, 'prices': {}, 'as_of': {}})
+
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(f"""
+            SELECT spid, {_LATEST_PRICE_COLUMNS}, as_of
+            FROM card_latest_prices
+            WHERE spid = ANY(%s)
+        """, (spids,))
+        rows = cur.fetchall()
         cur.close()
     finally:
         conn.close()
 
-    if not row:
-        return jsonify({})
-    return jsonify(dict(row))
+    return jsonify({
+        'success': True,
+        'prices': {str(row['spid']): latest_prices_payload(row) for row in rows},
+        'as_of': {str(row['spid']): row['as_of'].isoformat() for row in rows},
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -11,6 +11,7 @@ class ComparisonBasket {
         this.setupDragAndDrop();
         this.updateAddButtons();
         this.setupCompareButton();
+        this.setupCompareAllButton();
         this.updateClearButton();
     }
 
@@ -195,6 +196,10 @@ class ComparisonBasket {
         if (clearBtn) {
             clearBtn.disabled = this.basket.length === 0;
         }
+        const compareAllBtn = document.getElementById('compareAllBtn');
+        if (compareAllBtn) {
+            compareAllBtn.disabled = this.basket.length < 2;
+        }
     }
 
 
@@ -269,6 +274,21 @@ class ComparisonBasket {
         });
     }
 
+    // 바구니 전체 비교 (최대 6장, 비교 계산은 서버에서)
+    setupCompareAllButton() {
+        const compareAllBtn = document.getElementById('compareAllBtn');
+        if (!compareAllBtn) return;
+
+        compareAllBtn.addEventListener('click', () => {
+            if (this.basket.length < 2) return;
+            if (this.basket.length > 6) {
+                alert('한 번에 최대 6장까지 비교할 수 있습니다. 앞의 6장만 비교합니다.');
+            }
+            const spids = this.basket.slice(0, 6).map(card => card.spid).join(',');
+            window.open(`/compare?spids=${spids}`, '_blank');
+        });
+    }
+
 
     // + 버튼 상태 업데이트
     updateAddButtons() {
@@ -0,0 +1,125 @@
+"""선수 이름 인덱스(PlayerNameMatcher)의 초성/오타 허용 검색 검사
+
+오타 허용 검색이 편집 거리 기준 전수 비교와 같은 결과를 내는지, 짧은 검색어도 후보 상한 안에서 끝나는지,
+DB 경로(player_name_condition)가 인메모리 인덱스와 같은 이름을 고르는지 확인한다.
+"""
+
+import random
+import time
+
+import pytest
+
+import app
+
+SYLLABLES = '가나다라마바사아자차카타파하오이우에스르트드크리로니'
+PLAYERS = ['손흥민', '리오넬 메시', '해리 케인', '킬리안 음바페', '박지성', 'Son Heung-min']
+
+
+def make_names(count, seed):
+    """적은 음절로 만든 이름 (자모 gram 이 흔해 오타 허용 후보가 많이 생김)"""
+    rng = random.Random(seed)
+    names = set(PLAYERS)
+    while len(names) < count:
+        names.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 6))))
+    return sorted(names)
+
+
+def brute_force_fuzzy(matcher, term):
+    """모든 이름과 편집 거리를 계산한 match_fuzzy 기준 결과"""
+    jamo = app.hangul_jamo(term)
+    exact = {i for i, text in enumerate(matcher.jamo) if jamo in text}
+    if exact or len(jamo) < 4:
+        return exact
+    max_dist = 1 if len(jamo) <= 8 else 2
+    return {i for i, text in enumerate(matcher.jamo)
+            if app.substring_edit_distance(jamo, text, max_dist) <= max_dist}
+
+
+@pytest.fixture(scope='module')
+def small_matcher():
+    return app.PlayerNameMatcher(make_names(2000, seed=3))
+
+
+@pytest.fixture(scope='module')
+def large_matcher():
+    return app.PlayerNameMatcher(make_names(30000, seed=2))
+
+
+@pytest.mark.parametrize('term, expected', [
+    ('손흥', '손흥민'),
+    ('ㅅㅎㅁ', '손흥민'),
+    ('손ㅎㅁ', '손흥민'),
+    ('손흐', '손흥민'),
+    ('손흥빈', '손흥민'),
+    ('리오넬 메쉬', '리오넬 메시'),
+    ('킬리앙 음바페', '킬리안 음바페'),
+    ('son heung', 'Son Heung-min'),
+])
+def test_match_finds_player(small_matcher, term, expected):
+    assert expected in {small_matcher.names[i] for i in small_matcher.match(term)}
+
+
+def typo(name):
+    """첫 음절의 중성을 바꾼 이름 ('가나다' → '갸나다')"""
+    code = ord(name[0]) - 0xAC00
+    return chr(0xAC00 + code + 28 * (2 if code % 588 // 28 < 19 else -2)) + name[1:]
+
+
+@pytest.mark.parametrize('term', ['갸나', '뱌사', '리오넬 메쉬'])
+def test_fuzzy_matches_brute_force(small_matcher, term):
+    """후보 상한에 걸리지 않으면 조각 필터로 빠지는 이름이 없어야 함"""
+    assert small_matcher.match_fuzzy(term) == brute_force_fuzzy(small_matcher, term)
+
+
+def test_fuzzy_finds_one_vowel_typos(small_matcher):
+    for i in range(0, len(small_matcher.names), 97):
+        name = small_matcher.names[i]
+        if not '가' <= name[0] <= '힣':
+            continue
+        term = typo(name)
+        # 오타가 다른 이름의 부분 문자열이면 그 이름이 먼저 걸림 — 어느 쪽이든 전수 비교와 같아야 함
+        matched = small_matcher.match_fuzzy(term)
+        assert matched
+        assert matched == brute_force_fuzzy(small_matcher, term)
+
+
+@pytest.mark.parametrize('term', ['갸나', '뱌사', '캬타', '갸나다', '아아아아'])
+def test_fuzzy_short_terms_stay_within_candidate_cap(large_matcher, monkeypatch, term):
+    calls = []
+    distance = app.substring_edit_distance
+    monkeypatch.setattr(app, 'substring_edit_distance', lambda *args: calls.append(args) or distance(*args))
+
+    started = time.perf_counter()
+    large_matcher.match(term)
+    elapsed = time.perf_counter() - started
+
+    assert len(calls) <= app.FUZZY_MAX_CANDIDATES
+    assert elapsed < 0.5
+
+
+class FakeCursor:
+    """player_name_condition 이 보내는 쿼리만 흉내 (ILIKE 는 항상 0건)"""
+
+    def __init__(self, names):
+        self.names = names
+        self.rows = []
+
+    def execute(self, query, params=None):
+        self.rows = [{'player_name': name} for name in self.names] if 'DISTINCT' in query else []
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+
+@pytest.mark.parametrize('term', ['ㅅㅎㅁ', '손흥빈', ' 리오넬 메쉬 ', '갸나다'])
+def test_db_fallback_matches_memory_index(small_matcher, monkeypatch, term):
+    monkeypatch.setattr(app, 'current_data_version', lambda name: 1)
+    app.player_name_matchers.clear()
+
+    condition, params = app.player_name_condition(FakeCursor(small_matcher.names), term)
+
+    assert condition == 'player_name = ANY(%s)'
+    assert set(params[0]) == {small_matcher.names[i] for i in small_matcher.match(term)}
@@ -0,0 +1,219 @@
+"""인메모리 검색 엔진(CardFilterEngine)과 SQL 검색 경로(SearchSpec.to_sql / build_search_query)의 결과 일치 검사
+
+DB 없이 고정 카드 행으로 스냅샷을 만들고, to_sql 이 만드는 조건을 SQL 의미 그대로 파이썬으로 평가한
+기준 결과와 개수 / 정렬된 상위 카드를 비교한다.
+"""
+
+import random
+import re
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import app  # noqa: E402
+
+NEW_TRAITS = ['신규특성A', '신규특성B']
+TEAMCOLOR_PLAYERS = {'레전드': [1, 3, 5], '빈팀컬러': []}
+
+SPECIAL_NAMES = ['A_B', 'AXB', '100%', '1000', 'back\\slash', 'backXslash', 'Son', 'SON heung']
+NATIONS = ['대한민국', '잉글랜드', '뉴질랜드', '100%국', None]
+POSITIONS = ['ST', 'CF', 'LW', 'CAM', 'CB', 'GK']
+TRAITS = ['침착함', '강철체력', '먼 거리 슈팅'] + NEW_TRAITS
+CLUBS = ['토트넘', '레버쿠젠', '함부르크', '리버풀']
+BODY_TYPES = ['보통', '마름', '건장', None]
+
+
+def make_rows(count=120, seed=7):
+    """CARD_ENGINE_LOAD_QUERY 와 같은 컬럼의 카드 행 (NULL 값, 와일드카드 문자가 든 이름 포함)"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        name = SPECIAL_NAMES[i] if i < len(SPECIAL_NAMES) else f'선수{rng.randint(0, 30):02d}'
+        overall = None if i % 11 == 0 else rng.choice([90, 95, 95, 100, 104, 110])
+        nation = rng.choice(NATIONS)
+        rows.append({
+            'spid': 1000 + rng.randint(0, 10) * 1000 + i,
+            'player_name': name,
+            'season_name': 'S',
+            'overall': overall,
+            'body_type': rng.choice(BODY_TYPES),
+            'f_season_id': rng.choice([100, 200, 300]),
+            'f_salary': rng.choice([None, 10, 15, 20, 25]),
+            'f_height': rng.choice([None, 170, 180, 190]),
+            'f_weight': rng.choice([None, 65, 75, 85]),
+            'f_weak_foot': rng.choice([None, 2, 3, 4, 5]),
+            'f_preferred_foot': rng.choice(['L', 'R', None]),
+            'f_positions': rng.sample(POSITIONS, rng.randint(0, 3)),
+            'f_traits': rng.sample(TRAITS, rng.randint(0, 3)),
+            'f_clubs': rng.sample(CLUBS, rng.randint(0, 3)),
+            'f_nation': nation,
+            'f_pid': i % 8,
+        })
+    # DENSE_RANK() OVER (ORDER BY player_name)
+    names = sorted({r['player_name'] for r in rows})
+    rank = {name: i + 1 for i, name in enumerate(names)}
+    for r in rows:
+        r['f_name_rank'] = rank[r['player_name']]
+    return rows
+
+
+def sql_like(value, pattern, ignore_case=False):
+    """SQL LIKE 평가 (기본 이스케이프 문자 \\), value 가 NULL 이면 False"""
+    if value is None:
+        return False
+    regex, i = '', 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == '\\' and i + 1 < len(pattern):
+            regex += re.escape(pattern[i + 1])
+            i += 2
+            continue
+        regex += '.*' if ch == '%' else '.' if ch == '_' else re.escape(ch)
+        i += 1
+    flags = re.DOTALL | (re.IGNORECASE if ignore_case else 0)
+    return re.fullmatch(regex, value, flags) is not None
+
+
+def sql_param(spec, marker):
+    """spec.to_sql() 에서 marker 조건에 바인딩되는 파라미터"""
+    conditions, params = spec.to_sql()
+    return params[conditions[:conditions.index(marker)].count('%s')]
+
+
+def compare(value, op, bound):
+    # NULL 비교는 항상 거짓
+    return value is not None and (value >= bound if op == '>=' else value <= bound)
+
+
+def membership_match(row, spec):
+    """포지션/특성/신규 특성/국가/클럽/특성 팀컬러 조건 (비트맵 인덱스가 처리하는 부분)"""
+    if spec.positions and not set(row['f_positions']) & set(spec.positions):
+        return False
+    if spec.traits and not set(spec.traits) <= set(row['f_traits']):
+        return False
+    if spec.has_new_trait and not set(row['f_traits']) & set(NEW_TRAITS):
+        return False
+    if spec.nation and not sql_like(row['f_nation'], sql_param(spec, 'ca.nation LIKE')):
+        return False
+    if spec.clubs and not set(spec.clubs) <= set(row['f_clubs']):
+        return False
+    if spec.trait_team_color and row['f_pid'] not in TEAMCOLOR_PLAYERS.get(spec.trait_team_color, []):
+        return False
+    return True
+
+
+def reference_match(row, spec):
+    """to_sql 조건을 SQL 의미대로 평가"""
+    if spec.player_names:
+        patterns = sql_param(spec, 'player_name ILIKE ANY')
+        if not any(sql_like(row['player_name'], p, ignore_case=True) for p in patterns):
+            return False
+    if spec.seasons and row['f_season_id'] not in spec.seasons:
+        return False
+    for key, op, bound in (
+        ('overall', '>=', spec.min_ovr), ('overall', '<=', spec.max_ovr),
+        ('f_salary', '>=', spec.min_salary), ('f_salary', '<=', spec.max_salary),
+        ('f_weak_foot', '>=', spec.weak_foot_min),
+        ('f_height', '>=', spec.min_height), ('f_height', '<=', spec.max_height),
+        ('f_weight', '>=', spec.min_weight), ('f_weight', '<=', spec.max_weight),
+    ):
+        if bound is not None and not compare(row[key], op, bound):
+            return False
+    if spec.preferred_foot and row['f_preferred_foot'] != spec.preferred_foot:
+        return False
+    if spec.body_types and row['body_type'] not in spec.body_types:
+        return False
+    return membership_match(row, spec)
+
+
+def reference_order(rows):
+    """ORDER BY overall DESC (NULLS FIRST), player_name, spid"""
+    return sorted(rows, key=lambda r: (r['overall'] is not None, -(r['overall'] or 0), r['f_name_rank'], r['spid']))
+
+
+SPECS = [
+    app.SearchSpec(),
+    app.SearchSpec(player_names=('a_b',)),
+    app.SearchSpec(player_names=('100%',)),
+    app.SearchSpec(player_names=('back\\slash',)),
+    app.SearchSpec(player_names=('son', '선수1')),
+    app.SearchSpec(seasons=(100, 300), min_ovr=95),
+    app.SearchSpec(max_ovr=100, min_salary=15, max_salary=20),
+    app.SearchSpec(weak_foot_min=4, preferred_foot='L'),
+    app.SearchSpec(min_height=180, max_weight=75),
+    app.SearchSpec(body_types=('마름', '건장')),
+    app.SearchSpec(positions=('ST', 'CF')),
+    app.SearchSpec(traits=('침착함', '강철체력')),
+    app.SearchSpec(has_new_trait=True),
+    app.SearchSpec(nation='랜드'),
+    app.SearchSpec(nation='100%'),
+    app.SearchSpec(nation='_'),
+    app.SearchSpec(clubs=('레버쿠젠', '토트넘')),
+    app.SearchSpec(trait_team_color='레전드'),
+    app.SearchSpec(trait_team_color='없는팀컬러'),
+    app.SearchSpec(positions=('CB',), seasons=(200,), max_ovr=104, has_new_trait=True),
+]
+
+
+@pytest.fixture(scope='module')
+def snapshot_and_rows():
+    rows = make_rows()
+    bitmap = app.CardBitmapIndex(rows, NEW_TRAITS, TEAMCOLOR_PLAYERS, 1)
+    return app.CardSnapshot(rows, bitmap, {}, 1), rows
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return app.CardFilterEngine(False)
+
+
+@pytest.mark.parametrize('spec', SPECS, ids=lambda spec: spec.cache_key())
+def test_engine_matches_sql_semantics(engine, snapshot_and_rows, spec):
+    snap, rows = snapshot_and_rows
+    expected = reference_order([r for r in rows if reference_match(r, spec)])
+
+    total_count, cards = engine.search(snap, spec, 30)
+
+    assert total_count == len(expected)
+    assert [c['spid'] for c in cards] == [r['spid'] for r in expected[:30]]
+
+
+@pytest.mark.parametrize('spec', SPECS, ids=lambda spec: spec.cache_key())
+def test_bitmap_spids_match_sql_membership(snapshot_and_rows, spec):
+    """build_search_query 가 비트맵으로 바꿔 넘기는 spid 집합 = 멤버십 조건을 SQL 로 평가한 집합"""
+    snap, rows = snapshot_and_rows
+    search_conditions, search_params, _, _ = app.build_search_query(spec, snap.bitmap)
+    expected = {r['spid'] for r in rows if membership_match(r, spec)}
+
+    if snap.bitmap.resolve(spec) is None:
+        assert 'spid = ANY' not in search_conditions
+    else:
+        assert set(search_params[0]) == expected
+        # 멤버십 필터는 SQL 조건에서 빠짐
+        assert 'ca.nation LIKE' not in search_conditions
+        assert 'special_teamcolor_players' not in search_conditions
+
+
+def test_keyset_pages_follow_sql_order(engine, snapshot_and_rows):
+    """커서(overall, player_name, spid)로 이어 읽으면 NULL 오버롤 카드부터 SQL 정렬 순서 그대로"""
+    snap, rows = snapshot_and_rows
+    spec = app.SearchSpec()
+    expected = [r['spid'] for r in reference_order(rows)]
+    assert rows[0]['overall'] is None
+
+    spids, after = [], None
+    while True:
+        total_count, cards = engine.search(snap, spec, 7, after)
+        if not cards:
+            break
+        spids += [c['spid'] for c in cards]
+        after = app.decode_search_cursor(app.encode_search_cursor(cards[-1]))
+    assert total_count == len(rows)
+    assert spids == expected
+
+
+def test_like_contains_escapes_wildcards():
+    assert app.like_contains('a_b%c\\d') == '%a\\_b\\%c\\\\d%'
+    assert sql_like('A_B', app.like_contains('a_b'), ignore_case=True)
+    assert not sql_like('AXB', app.like_contains('a_b'), ignore_case=True)